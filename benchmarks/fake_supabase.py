@@ -0,0 +1,731 @@
+"""
+In-process stand-in for the supabase client, for benchmarks and local experiments.
+
+It implements the subset of the PostgREST query builder and the storage API the manager
+classes use. Rows live in memory, uploaded objects in a temporary directory and their
+public urls are file:// urls, so pandas can read schedules back without a network.
+
+    from database import set_supabase_client
+    from fake_supabase import FakeSupabase, seed_portfolio
+
+    client = FakeSupabase()
+    seed_portfolio(client, loans=10_000)
+    set_supabase_client(client)
+
+not_ only negates the next eq, neq or is_ filter (e.g. not_.is_('loan_file_id', 'null') in
+notifications.py). Not covered: embedded resources in select strings, or filters, other
+negations, rpc, auth, and the resumable upload endpoint (uploads over
+uploads.STREAMING_THRESHOLD still need a project).
+"""
+import json
+import os
+import random
+import shutil
+import tempfile
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+
+class FakeAPIError(Exception):
+    """raised where postgrest would answer with an error, e.g. single() not matching one row"""
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+class FakeStorageError(Exception):
+    """raised where the storage api would answer with an error"""
+
+
+class FakeResponse:
+    """
+    shaped like a postgrest APIResponse, with the content_length of the json body postgrest
+    would have sent, which instrumentation records in place of the http response's
+    """
+
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+        self.content_length = len(json.dumps(data, default=str))
+
+
+def match_key(value):
+    """
+    Normalises a value for equality, postgres casts the filter to the column type so
+    eq('id', '5') matches an integer id of 5.
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def compare_key(value):
+    """orders numbers numerically and everything else (iso dates included) as text"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return 0, float(value), ''
+    try:
+        return 0, float(value), ''
+    except (TypeError, ValueError):
+        return 1, 0.0, str(value)
+
+
+class FakeQuery:
+    """one postgrest request being built, run by execute()"""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.operation = 'select'
+        self.columns = None
+        self.count = None
+        self.payload = None
+        self.filters = []
+        self.orders = []
+        self.limit_to = None
+        self.row_range = None
+        self.single_row = False
+        self.maybe_single_row = False
+        self.negate_next = False
+
+    # --- operations
+
+    def select(self, *columns, count=None):
+        names = [name.strip() for column in columns for name in column.split(',') if name.strip()]
+        self.columns = None if not names or '*' in names else names
+        self.count = count
+        return self
+
+    def insert(self, data, **kwargs):
+        self.operation = 'insert'
+        self.payload = data
+        return self
+
+    def upsert(self, data, on_conflict='id', **kwargs):
+        self.operation = 'upsert'
+        self.payload = data
+        self.conflict_columns = [column.strip() for column in on_conflict.split(',')]
+        return self
+
+    def update(self, data, **kwargs):
+        self.operation = 'update'
+        self.payload = data
+        return self
+
+    def delete(self, **kwargs):
+        self.operation = 'delete'
+        return self
+
+    # --- filters, values are normalised once here rather than for every row
+
+    @property
+    def not_(self):
+        self.negate_next = True
+        return self
+
+    def add_equality(self, operator, column, value):
+        """eq and neq filters, not_ swaps them (the only negations the app uses)"""
+        if self.negate_next:
+            operator = 'neq' if operator == 'eq' else 'eq'
+            self.negate_next = False
+        self.filters.append((operator, column, value))
+        return self
+
+    def eq(self, column, value):
+        return self.add_equality('eq', column, match_key(value))
+
+    def neq(self, column, value):
+        return self.add_equality('neq', column, match_key(value))
+
+    def in_(self, column, values):
+        self.filters.append(('in', column, frozenset(match_key(value) for value in values)))
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(('gt', column, compare_key(value)))
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(('gte', column, compare_key(value)))
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(('lt', column, compare_key(value)))
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(('lte', column, compare_key(value)))
+        return self
+
+    def is_(self, column, value):
+        return self.add_equality('eq', column, None if value in ('null', None) else match_key(value))
+
+    # --- modifiers
+
+    def order(self, column, desc=False, **kwargs):
+        for part in column.split(','):
+            self.orders.append((part.strip(), desc))
+        return self
+
+    def limit(self, size, **kwargs):
+        self.limit_to = size
+        return self
+
+    def range(self, start, end, **kwargs):
+        self.row_range = (start, end)
+        return self
+
+    def single(self):
+        self.single_row = True
+        return self
+
+    def maybe_single(self):
+        self.maybe_single_row = True
+        return self
+
+    # --- execution
+
+    def matches(self, row):
+        for operator, column, value in self.filters:
+            current = row.get(column)
+            if operator == 'eq':
+                if match_key(current) != value:
+                    return False
+            elif operator == 'neq':
+                if match_key(current) == value:
+                    return False
+            elif operator == 'in':
+                if match_key(current) not in value:
+                    return False
+            elif current is None:
+                return False
+            else:
+                current = compare_key(current)
+                if operator == 'gt' and not current > value:
+                    return False
+                if operator == 'gte' and not current >= value:
+                    return False
+                if operator == 'lt' and not current < value:
+                    return False
+                if operator == 'lte' and not current <= value:
+                    return False
+        return True
+
+    def candidates(self):
+        """rows that can match, an eq or in_ filter narrows them with the client's index on that column"""
+        for operator, column, value in self.filters:
+            if operator == 'eq':
+                return self.client.index(self.table, column).get(value, [])
+            if operator == 'in':
+                index = self.client.index(self.table, column)
+                return [row for key in value for row in index.get(key, ())]
+
+        return self.client.rows(self.table)
+
+    def selected_rows(self):
+        """matching rows in the requested order, cached until the table changes"""
+        cache_key = (self.table, tuple(self.filters), tuple(self.orders))
+        cached = self.client.cached(cache_key)
+        if cached is not None:
+            return cached
+
+        rows = [row for row in self.candidates() if self.matches(row)]
+        for column, desc in reversed(self.orders):
+            rows.sort(key=lambda row: (row.get(column) is None, compare_key(row.get(column))), reverse=desc)
+
+        self.client.cache(cache_key, rows)
+        return rows
+
+    def project(self, row):
+        if self.columns is None:
+            return dict(row)
+        return {column: row.get(column) for column in self.columns}
+
+    def execute(self):
+        self.client.calls.append((self.table, self.operation))
+
+        if self.operation == 'insert':
+            items = self.payload if isinstance(self.payload, list) else [self.payload]
+            return FakeResponse([dict(row) for row in self.client.insert_rows(self.table, items)])
+
+        if self.operation == 'upsert':
+            items = self.payload if isinstance(self.payload, list) else [self.payload]
+            stored = []
+            for item in items:
+                key = [item.get(column) for column in self.conflict_columns]
+                rows = [row for row in self.client.rows(self.table)
+                        if [row.get(column) for column in self.conflict_columns] == key]
+                if rows:
+                    self.client.update_rows(self.table, rows, item)
+                    stored += rows
+                else:
+                    stored += self.client.insert_rows(self.table, [item])
+            return FakeResponse([dict(row) for row in stored])
+
+        if self.operation in ('update', 'delete'):
+            rows = [row for row in self.candidates() if self.matches(row)]
+            if self.operation == 'update':
+                self.client.update_rows(self.table, rows, self.payload)
+            else:
+                self.client.delete_rows(self.table, rows)
+            return FakeResponse([dict(row) for row in rows])
+
+        rows = self.selected_rows()
+        total = len(rows)
+        if self.row_range is not None:
+            rows = rows[self.row_range[0]:self.row_range[1] + 1]
+        if self.limit_to is not None:
+            rows = rows[:self.limit_to]
+
+        data = [self.project(row) for row in rows]
+        count = total if self.count else None
+
+        if self.single_row or self.maybe_single_row:
+            if len(data) > 1 or (self.single_row and not data):
+                raise FakeAPIError(f'JSON object requested, multiple (or no) rows returned from {self.table}',
+                                   code='PGRST116')
+            return FakeResponse(data[0] if data else None, count)
+
+        return FakeResponse(data, count)
+
+
+class FakeBucket:
+    """one storage bucket, objects are written under the storage root"""
+
+    def __init__(self, storage, name):
+        self.storage = storage
+        self.name = name
+
+    def object_path(self, path):
+        return os.path.join(self.storage.root, 'storage', 'v1', 'object', 'public', self.name, path)
+
+    def upload(self, path, file, file_options=None):
+        self.storage.client.calls.append((f'storage:{self.name}', 'upload'))
+        upsert = str((file_options or {}).get('upsert', (file_options or {}).get('x-upsert', 'false'))).lower()
+        target = self.object_path(path)
+        if os.path.exists(target) and upsert != 'true':
+            raise FakeStorageError(f'The resource already exists: {self.name}/{path}')
+
+        content = file if isinstance(file, (bytes, bytearray)) else file.read()
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as stored:
+            stored.write(content)
+
+        return SimpleNamespace(path=path, full_path=f'{self.name}/{path}', error=None)
+
+    def update(self, path, file, file_options=None):
+        return self.upload(path, file, {**(file_options or {}), 'upsert': 'true'})
+
+    def download(self, path):
+        self.storage.client.calls.append((f'storage:{self.name}', 'download'))
+        with open(self.object_path(path), 'rb') as stored:
+            return stored.read()
+
+    def remove(self, paths):
+        self.storage.client.calls.append((f'storage:{self.name}', 'remove'))
+        removed = []
+        for path in paths:
+            try:
+                os.remove(self.object_path(path))
+                removed.append({'name': path, 'bucket_id': self.name})
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def list(self, path=None, options=None):
+        self.storage.client.calls.append((f'storage:{self.name}', 'list'))
+        directory = self.object_path(path or '')
+        if not os.path.isdir(directory):
+            return []
+        return [{'name': name} for name in sorted(os.listdir(directory))]
+
+    def get_public_url(self, path, options=None):
+        return 'file://' + self.object_path(path)
+
+
+class FakeStorage:
+    """the storage client, objects live in a temporary directory removed by FakeSupabase.close()"""
+
+    def __init__(self, client):
+        self.client = client
+        self.root = tempfile.mkdtemp(prefix='fake_supabase_')
+        self.buckets = ['borrower-files', 'loan-files']
+
+    def from_(self, name):
+        return FakeBucket(self, name)
+
+    def list_buckets(self):
+        return [SimpleNamespace(name=name, id=name) for name in self.buckets]
+
+
+def latest_borrower_balances(client):
+    """sql/latest_borrower_balances.sql: each borrower's newest repayment"""
+    latest = {}
+    for row in client.rows('loan_repayments'):
+        current = latest.get(row.get('borrower_id'))
+        if current is None or row.get('created_at', '') > current['created_at']:
+            latest[row.get('borrower_id')] = {
+                'borrower_id': row.get('borrower_id'),
+                'balance': row.get('balance'),
+                'created_at': row.get('created_at', '')
+            }
+    return list(latest.values())
+
+
+def loan_portfolio(client):
+    """sql/loan_portfolio.sql: every loan with its request's method and its repayment count"""
+    methods = {row['id']: row.get('method') for row in client.rows('loan_requests')}
+    counts = Counter(row.get('loan_id') for row in client.rows('loan_repayments'))
+    return [
+        {**loan, 'method': methods.get(loan.get('loan_request_id')), 'repayment_count': counts.get(loan['id'], 0)}
+        for loan in client.rows('loans')
+    ]
+
+
+# views -> (tables they read, builder), computed on first read after one of the tables changes
+VIEWS = {
+    'latest_borrower_balances': (('loan_repayments',), latest_borrower_balances),
+    'loan_portfolio': (('loans', 'loan_requests', 'loan_repayments'), loan_portfolio)
+}
+
+
+class FakeSupabase:
+    """
+    In-memory supabase client. Tables are lists of dict rows; eq and in_ filters use hash
+    indexes and ordered results are cached, both dropped whenever the table is written,
+    so paging through a large table stays cheap.
+    """
+
+    def __init__(self):
+        self.tables = {}
+        self.calls = []
+        self.storage = FakeStorage(self)
+        self._indexes = {}
+        self._results = {}
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def from_(self, name):
+        return FakeQuery(self, name)
+
+    def close(self):
+        """removes the stored objects"""
+        shutil.rmtree(self.storage.root, ignore_errors=True)
+
+    # --- storage of rows
+
+    def rows(self, table):
+        if table in VIEWS and table not in self.tables:
+            self.tables[table] = VIEWS[table][1](self)
+        return self.tables.setdefault(table, [])
+
+    def index(self, table, column):
+        key = (table, column)
+        index = self._indexes.get(key)
+        if index is None:
+            index = {}
+            for row in self.rows(table):
+                index.setdefault(match_key(row.get(column)), []).append(row)
+            self._indexes[key] = index
+        return index
+
+    def cached(self, key):
+        return self._results.get(key)
+
+    def cache(self, key, rows):
+        self._results[key] = rows
+
+    def changed(self, table):
+        """drops the indexes and cached results of a table, and the views built on it, after a write"""
+        for view, (sources, _) in VIEWS.items():
+            if table in sources and view in self.tables:
+                del self.tables[view]
+                self.changed(view)
+
+        self._indexes = {key: index for key, index in self._indexes.items() if key[0] != table}
+        self._results = {key: rows for key, rows in self._results.items() if key[0] != table}
+
+    def insert_rows(self, table, items):
+        now = datetime.now(timezone.utc).isoformat()
+        inserted = []
+        for item in items:
+            row = dict(item)
+            row.setdefault('id', str(uuid.uuid4()))
+            row.setdefault('created_at', now)
+            inserted.append(row)
+
+        self.rows(table).extend(inserted)
+        self.changed(table)
+        return inserted
+
+    def update_rows(self, table, rows, values):
+        for row in rows:
+            row.update(values)
+        self.changed(table)
+
+    def delete_rows(self, table, rows):
+        doomed = {id(row) for row in rows}
+        self.tables[table] = [row for row in self.rows(table) if id(row) not in doomed]
+        self.changed(table)
+
+    def load(self, table, rows):
+        """replaces a table's rows without going through insert (seeding)"""
+        self.tables[table] = rows
+        self.changed(table)
+
+
+FIRST_NAMES = ('Chanda', 'Mwila', 'Bwalya', 'Mutale', 'Natasha', 'Kondwani', 'Thandiwe', 'Musonda', 'Lushomo', 'Kabwe')
+LAST_NAMES = ('Banda', 'Phiri', 'Mwanza', 'Zulu', 'Tembo', 'Lungu', 'Daka', 'Mulenga', 'Sakala', 'Chileshe')
+
+
+def seed_portfolio(client, loans=100, seed=0, now=None):
+    """
+    Fills a FakeSupabase with a synthetic book of the given number of loans: organisations,
+    users, borrowers (with next of kin and bank details), one approved request per loan plus
+    some pending ones, the loans, their repayments so far, a wallet history, the nominal
+    rate and settings rows. The portfolio metrics are left for metrics.PortfolioMetrics().rebuild().
+
+    Args:
+        client: FakeSupabase to fill, existing rows are replaced
+        loans: Number of loans
+        seed: Random seed, the same seed gives the same book
+        now: datetime the book is built up to, defaults to the current time
+
+    Returns:
+        dict: Ids useful to drive routes (organisation_id, borrower_id, loan_id, loan_request_id,
+        pending_request_id, user_id, nrc_number)
+    """
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc)
+    start = now - timedelta(days=540)
+
+    organisation_count = max(3, loans // 2000)
+    borrower_count = max(1, (loans * 2) // 3)
+    pending_count = max(1, loans // 20)
+    monthly_rate = 0.05
+
+    organisations = [{
+        'id': f'org-{i}',
+        'name': f'Organisation {i}',
+        'email': f'payroll{i}@example.org',
+        'address': f'Plot {i}, Lusaka',
+        'created_at': start.isoformat()
+    } for i in range(organisation_count)]
+
+    users = [{
+        'id': f'user-{i}',
+        'user_name': f'officer{i}',
+        'email': f'officer{i}@example.org',
+        'password': 'not-a-real-hash',
+        'user_type': 'admin' if i == 0 else 'loan_officer',
+        'nrc_number': f'1000{i}/10/1',
+        'date_of_birth': '1990-01-01',
+        'created_at': start.isoformat()
+    } for i in range(3)]
+
+    next_of_kins = []
+    borrower_banks = []
+    borrowers = []
+    for i in range(borrower_count):
+        borrower_id = f'borrower-{i}'
+        next_of_kins.append({
+            'id': f'kin-{i}',
+            'first_name': rng.choice(FIRST_NAMES),
+            'last_name': rng.choice(LAST_NAMES),
+            'phone': f'097{i:07d}',
+            'email': f'kin{i}@example.org'
+        })
+        borrower_banks.append({
+            'id': f'bank-{i}',
+            'borrower_id': borrower_id,
+            'bank_name': 'Zanaco',
+            'branch_name': 'Cairo Road',
+            'swift_code': 'ZNCOZMLU',
+            'account_number': f'{i:012d}',
+            'created_at': start.isoformat()
+        })
+        borrowers.append({
+            'id': borrower_id,
+            'first_name': rng.choice(FIRST_NAMES),
+            'last_name': rng.choice(LAST_NAMES),
+            'nrc_number': f'{i:06d}/11/1',
+            'organisation_id': organisations[i % organisation_count]['id'],
+            'email': f'borrower{i}@example.org',
+            'phone': f'096{i:07d}',
+            'address': f'House {i}, Lusaka',
+            'gender': rng.choice(('male', 'female')),
+            'date_of_birth': '1988-05-17',
+            'occupation': 'Teacher',
+            'employee_id': f'EMP{i:06d}',
+            'next_of_kin_id': f'kin-{i}',
+            'nrc_files': [],
+            'proof_residency_files': [],
+            'created_at': start.isoformat()
+        })
+
+    loan_requests = []
+    loan_rows = []
+    repayments = []
+    for i in range(loans):
+        borrower = borrowers[i % borrower_count]
+        principal = float(rng.randrange(500, 50_000, 50))
+        months = rng.randint(1, 12)
+        method = rng.choice(('simple', 'amortisation'))
+        if method == 'simple':
+            instalment = round(principal / months + principal * monthly_rate, 2)
+        else:
+            instalment = round(principal * monthly_rate / (1 - (1 + monthly_rate) ** -months), 2)
+
+        created = start + timedelta(days=rng.randint(0, 520), seconds=rng.randint(0, 86_399))
+        request_id = f'request-{i}'
+        user_id = users[i % len(users)]['id']
+
+        loan_requests.append({
+            'id': request_id,
+            'borrower_id': borrower['id'],
+            'user_id': user_id,
+            'principal': principal,
+            'tenure': months * 30,
+            'months_tenure': months,
+            'interest': round(instalment * months - principal, 2),
+            'total_payable': round(instalment * months, 2),
+            'instalments': instalment,
+            'method': method,
+            'status': 'approved',
+            'start_date': created.date().isoformat(),
+            'end_date': (created + timedelta(days=30 * months)).date().isoformat(),
+            'loan_file_id': None,
+            'created_at': created.isoformat()
+        })
+
+        elapsed = min(months, (now - created).days // 30)
+        loan_id = f'loan-{i}'
+        loan_rows.append({
+            'id': loan_id,
+            'loan_request_id': request_id,
+            'borrower_id': borrower['id'],
+            'organisation_id': borrower['organisation_id'],
+            'user_id': user_id,
+            'loan_amount': principal,
+            'interest_rate': monthly_rate,
+            'term_months': months,
+            'monthly_payment': instalment,
+            'start_date': created.date().isoformat(),
+            'end_date': (created + timedelta(days=30 * months)).date().isoformat(),
+            'status': 'active' if elapsed < months else 'completed',
+            'remaining_payments': months - elapsed,
+            'interval': 30,
+            'created_at': created.isoformat()
+        })
+
+        balance = principal
+        for k in range(elapsed):
+            interest = round((principal if method == 'simple' else balance) * monthly_rate, 2)
+            principal_part = round(min(balance, instalment - interest), 2)
+            balance = round(balance - principal_part, 2)
+            paid_at = created + timedelta(days=30 * (k + 1))
+            repayments.append({
+                'id': f'repayment-{i}-{k}',
+                'loan_id': loan_id,
+                'borrower_id': borrower['id'],
+                'organisation_id': borrower['organisation_id'],
+                'payment_amount': instalment,
+                'payment_date': paid_at.date().isoformat(),
+                'principal_component': principal_part,
+                'interest_component': interest,
+                # get_repayment_summary reads the same split under these names
+                'principal_amount': principal_part,
+                'interest_amount': interest,
+                'balance': balance,
+                'created_at': paid_at.isoformat()
+            })
+
+    notifications = []
+    for i in range(pending_count):
+        borrower = borrowers[rng.randrange(borrower_count)]
+        principal = float(rng.randrange(500, 20_000, 50))
+        request_id = f'pending-request-{i}'
+        loan_requests.append({
+            'id': request_id,
+            'borrower_id': borrower['id'],
+            'user_id': users[1]['id'],
+            'principal': principal,
+            'tenure': 180,
+            'months_tenure': 6,
+            'interest': round(principal * monthly_rate * 6, 2),
+            'total_payable': round(principal * (1 + monthly_rate * 6), 2),
+            'instalments': round(principal * (1 + monthly_rate * 6) / 6, 2),
+            'method': 'simple',
+            'status': 'pending',
+            'start_date': now.date().isoformat(),
+            'end_date': (now + timedelta(days=180)).date().isoformat(),
+            'loan_file_id': None,
+            'created_at': now.isoformat()
+        })
+        notifications.append({
+            'id': f'notification-{i}',
+            'notification': f'Loan Application Pending Approval: ZMW {principal:,.2f}',
+            'borrower_id': borrower['id'],
+            'request_id': request_id,
+            'user_id': users[1]['id'],
+            'status': 'active',
+            'created_at': now.isoformat()
+        })
+
+    balance = 0.0
+    wallet = []
+    for i in range(max(10, loans // 100)):
+        amount = float(rng.randrange(1_000, 100_000, 100))
+        balance += amount
+        wallet.append({
+            'id': f'wallet-{i}',
+            'transaction_number': f'TXN{i:08d}',
+            'transaction_type': 'loan_repayment',
+            'description': f'repayment {i}',
+            'status': 'successful',
+            'amount': amount,
+            'balance': round(balance, 2),
+            'created_at': (start + timedelta(days=i % 540)).isoformat()
+        })
+
+    client.load('organisations', organisations)
+    client.load('users', users)
+    client.load('next_of_kins', next_of_kins)
+    client.load('borrower_banks', borrower_banks)
+    client.load('borrowers', borrowers)
+    client.load('borrower_files', [])
+    client.load('loan_requests', loan_requests)
+    client.load('loans', loan_rows)
+    client.load('loan_repayments', repayments)
+    client.load('loan_files', [])
+    client.load('notifications', notifications)
+    client.load('wallet', wallet)
+    client.load('nominal_rate', [{'id': 1, 'nominal_rate': monthly_rate}])
+    client.load('business_information', [{
+        'id': 1, 'company_name': 'Bridge Trust', 'business_address': 'Lusaka', 'telephone_number': '0211000000',
+        'organization_email': 'info@example.org', 'nominal_rate': monthly_rate
+    }])
+    client.load('partners', [{'id': 'partner-0', 'institution_name': 'Zanaco', 'account_number': '000000000001',
+                              'bank_name': 'Zanaco', 'branch_info': 'Cairo Road', 'swift_code': 'ZNCOZMLU'}])
+    client.load('secret_keys', [{'id': 1, 'key': 'benchmark-secret-key'}])
+    client.load('effective_rate_amount', [])
+    client.load('portfolio_metrics', [])
+    client.load('interest_rollups', [])
+
+    return {
+        'organisation_id': organisations[0]['id'],
+        'borrower_id': borrowers[0]['id'],
+        'nrc_number': borrowers[0]['nrc_number'],
+        'loan_id': loan_rows[0]['id'] if loan_rows else None,
+        'loan_request_id': loan_requests[0]['id'] if loan_rows else None,
+        'pending_request_id': 'pending-request-0',
+        'user_id': users[0]['id']
+    }
@@ -0,0 +1,135 @@
+"""
+Startup budget for the web app: how long `import main` takes, how many network calls
+and supabase clients it makes and which heavy modules it loads. Every gunicorn worker pays this at boot, so importing the
+app must stay cheap and must not touch the database.
+
+Each run imports main in a fresh interpreter with the network disabled; the median wall
+time is compared to the budget. Exits 1 when a budget is exceeded.
+
+    python benchmarks/import_budget.py [--runs 5] [--max-seconds 1.0] [--max-network-calls 0]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# wall time budget for `import main`, with headroom over a cold import on a dev machine
+IMPORT_BUDGET_SECONDS = 1.0
+
+# importing the app must not open connections or create database clients
+NETWORK_CALL_BUDGET = 0
+CLIENT_BUDGET = 0
+
+# loaded on first use by the routes that need them (or by create_app(preload=True)), never by the import
+HEAVY_MODULES = ('pandas', 'numpy', 'supabase', 'httpx')
+
+
+def measure_import():
+    """imports main with the network disabled and prints the measurements as json (child process)"""
+    import socket
+    import time
+
+    network_calls = []
+
+    def refuse(name):
+        def blocked(*args, **kwargs):
+            network_calls.append(name)
+            raise ConnectionRefusedError(f'network disabled during the import benchmark ({name})')
+        return blocked
+
+    socket.socket.connect = refuse('connect')
+    socket.socket.connect_ex = refuse('connect_ex')
+    socket.create_connection = refuse('create_connection')
+    socket.getaddrinfo = refuse('getaddrinfo')
+
+    # placeholder credentials so a client, if one is created, is counted instead of failing
+    os.environ.setdefault('SUPABASE_URL', 'http://127.0.0.1:9')
+    os.environ.setdefault('SUPABASE_SERVICE_ROLE_KEY', 'import-budget')
+    sys.path.insert(0, REPO_DIR)
+    os.chdir(REPO_DIR)
+
+    started = time.perf_counter()
+
+    # installed before the app modules import it, so every client request is counted
+    import database
+    clients = []
+    get_supabase_client = database.get_supabase_client
+
+    def counting_get_supabase_client():
+        clients.append(1)
+        return get_supabase_client()
+
+    database.get_supabase_client = counting_get_supabase_client
+
+    import main  # noqa: F401
+
+    elapsed = time.perf_counter() - started
+    heavy_modules = [module for module in HEAVY_MODULES if module in sys.modules]
+
+    print(json.dumps({'seconds': elapsed, 'network_calls': network_calls, 'clients': len(clients),
+                      'heavy_modules': heavy_modules}))
+
+
+def run_once():
+    """runs one measurement in a fresh interpreter and returns its result"""
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child'],
+        capture_output=True, text=True, cwd=REPO_DIR
+    )
+    if completed.returncode != 0:
+        print(completed.stdout)
+        print(completed.stderr, file=sys.stderr)
+        raise SystemExit(f'import main failed with exit code {completed.returncode}')
+
+    # modules may print while importing, the measurement is the last line
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, default=IMPORT_BUDGET_SECONDS)
+    parser.add_argument('--max-network-calls', type=int, default=NETWORK_CALL_BUDGET)
+    parser.add_argument('--max-clients', type=int, default=CLIENT_BUDGET)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure_import()
+        return 0
+
+    results = [run_once() for _ in range(args.runs)]
+    seconds = statistics.median(result['seconds'] for result in results)
+    network_calls = max(len(result['network_calls']) for result in results)
+    clients = max(result['clients'] for result in results)
+    heavy_modules = sorted(set(module for result in results for module in result['heavy_modules']))
+
+    print(f'import main: {seconds:.3f}s median of {args.runs} runs (budget {args.max_seconds:.3f}s)')
+    print(f'network calls: {network_calls} (budget {args.max_network_calls})')
+    print(f'supabase clients created: {clients} (budget {args.max_clients})')
+    print(f"heavy modules loaded: {', '.join(heavy_modules) or 'none'}")
+
+    failures = []
+    if seconds > args.max_seconds:
+        failures.append(f'import took {seconds:.3f}s, budget is {args.max_seconds:.3f}s')
+    if network_calls > args.max_network_calls:
+        calls = ', '.join(sorted(set(call for result in results for call in result['network_calls'])))
+        failures.append(f'{network_calls} network calls during import ({calls}), budget is {args.max_network_calls}')
+    if clients > args.max_clients:
+        failures.append(f'{clients} supabase clients created during import, budget is {args.max_clients}')
+    if heavy_modules:
+        failures.append(f"{', '.join(heavy_modules)} imported by main, they must be imported on first use")
+
+    for failure in failures:
+        print(f'FAIL: {failure}', file=sys.stderr)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,313 @@
+"""
+Latency and supabase call counts of the web routes against an in-process fake backend
+(benchmarks/fake_supabase.py), seeded with a synthetic book at each scale. No supabase
+project or network is needed, so numbers are comparable between machines and commits.
+
+For every route: status, median and p95 wall time, the supabase calls per request and the
+queries they make up (a paged fetch is one query), rows and bytes returned, repeated query
+shapes (N+1) and the route's budgets from instrumentation.QUERY_BUDGETS and CALL_BUDGETS.
+With --check it exits 1 when a route errors or goes over either budget.
+
+    python benchmarks/route_benchmarks.py [--loans 100 10000 100000] [--runs 10] [--route home] [--check]
+
+The same routes and checks run under pytest-benchmark in benchmarks/test_routes.py.
+
+Routes that send email or change the book for good (signup, add_borrower, approve_loan,
+cash_out, ...) are not driven; /loan_request is, each run adds one pending request.
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRATCH_DIR = tempfile.mkdtemp(prefix='bridgetrust_benchmarks_')
+
+# the app's local state (jobs, quotes, caches) goes to a scratch directory, never the repo
+os.environ.setdefault('SUPABASE_URL', 'http://127.0.0.1:9')
+os.environ.setdefault('SUPABASE_SERVICE_ROLE_KEY', 'route-benchmarks')
+for name, directory in (('JOBS_DB_PATH', 'jobs.sqlite3'), ('QUOTE_STORE_DIR', 'quotes'),
+                        ('SCHEDULE_CACHE_DIR', 'schedules'), ('CONFIG_VERSION_FILE', 'config_version')):
+    os.environ[name] = os.path.join(SCRATCH_DIR, directory)
+
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_SCALES = (100, 10_000, 100_000)
+
+
+def route_plan(ids):
+    """
+    The requests to time, as (endpoint, method, path, form or json).
+    ids is what seed_portfolio returned plus the documented request of attach_documents.
+    """
+    summary_form = {
+        'organisation_id': ids['organisation_id'],
+        'borrower_nrc': ids['nrc_number'],
+        'principal': '5000',
+        'days': '90',
+        'method': 'amortisation'
+    }
+    request_form = {
+        'borrower_id': ids['borrower_id'],
+        'principal': '5000',
+        'recoverable_amount': '5500',
+        'monthly_rate': '0.05',
+        'effective_amount': '500',
+        'effective_rate': '0.1',
+        'days': '90',
+        'loan_tenure_months': '3',
+        'method': 'simple',
+        'instalments': '1916.67'
+    }
+    quotes = {'scenarios': [{'principal': 1000 * k, 'days': 30 * k, 'method': 'simple'} for k in range(1, 11)]}
+
+    return [
+        ('login', 'GET', '/login', None),
+        ('home', 'GET', '/home', None),
+        ('get_all_interest_data', 'GET', '/get_interest_data', None),
+        ('get_interest_data', 'GET', f"/get_interest_data/{time.gmtime().tm_year}", None),
+        ('organisation_transactions', 'GET', '/organisation_transactions', None),
+        ('organisation_borrowers', 'GET', f"/organisation_borrowers/{ids['organisation_id']}", None),
+        ('borrower_management', 'GET', '/borrower_management', None),
+        ('get_borrower_data', 'GET', f"/get_borrower_data/{ids['borrower_id']}", None),
+        ('loan_information', 'GET', f"/loan_information/{ids['loan_id']}", None),
+        ('loan_application', 'GET', '/loan_application', None),
+        ('loan_application_summary', 'POST', '/loan_application_summary', summary_form),
+        ('loan_quotes', 'POST', '/loan_quotes', quotes),
+        ('create_loan_request', 'POST', '/loan_request', request_form),
+        ('loan_approvals', 'GET', '/loan_approvals', None),
+        ('loan_request_information', 'GET',
+         f"/loan_request_information/{ids['documented_request_id']}/pending", None),
+        ('wallet', 'GET', '/wallet', None),
+        ('withdraw', 'GET', '/withdraw', None),
+        ('account_info_settings', 'GET', '/account_info_settings', None),
+        ('user_settings', 'GET', '/user_settings', None),
+        ('partner_settings', 'GET', '/partner_settings', None)
+    ]
+
+
+def attach_documents(client, request_id):
+    """generates and stores the contract and schedule of a pending request, as the job worker would"""
+    from loans import Loans
+
+    loans_manager = Loans()
+    request_row = client.rows('loan_requests')
+    loan_request = next(row for row in request_row if row['id'] == request_id)
+    loan_summary = {
+        'principal': loan_request['principal'],
+        'loan_tenure_days': loan_request['tenure'],
+        'method': loan_request['method']
+    }
+
+    documents = loans_manager.build_loan_documents(loan_summary, loan_request['borrower_id'])
+    files_result = loans_manager.upload_and_store_loan_files(
+        contract_content=documents['contract_content'],
+        payment_schedule_df=documents['payment_schedule_df'],
+        borrower_name=documents['borrower_name'],
+        borrower_id=loan_request['borrower_id'],
+        schedule_df=documents['schedule_df'],
+        schedule_summary=documents['schedule_summary']
+    )
+    if not files_result['status']:
+        raise RuntimeError(files_result['message'])
+
+    client.table('loan_requests').update({'loan_file_id': files_result['loan_file_id']}).eq('id', request_id).execute()
+
+
+def build_book(loans):
+    """seeds a fake backend with the given number of loans and installs it as the shared client"""
+    import database
+    from fake_supabase import FakeSupabase, seed_portfolio
+    from metrics import PortfolioMetrics
+
+    client = FakeSupabase()
+    ids = seed_portfolio(client, loans=loans)
+    database.set_supabase_client(client)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        PortfolioMetrics().rebuild()
+        attach_documents(client, ids['pending_request_id'])
+
+    ids['documented_request_id'] = ids['pending_request_id']
+    return client, ids
+
+
+@contextlib.contextmanager
+def captured_calls(app):
+    """collects the supabase calls of each request while active, the last request's are in ['calls']"""
+    captured = {'calls': []}
+
+    def capture(response):
+        from instrumentation import request_calls
+        captured['calls'] = list(request_calls())
+        return response
+
+    app.after_request_funcs.setdefault(None, []).insert(0, capture)
+    try:
+        yield captured
+    finally:
+        app.after_request_funcs[None].remove(capture)
+
+
+def send_request(test_client, method, path, payload):
+    """makes one planned request, json for the batch quote api and a form otherwise"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        if method == 'GET':
+            return test_client.get(path)
+        if isinstance(payload, dict) and 'scenarios' in payload:
+            return test_client.post(path, json=payload)
+        return test_client.post(path, data=payload)
+
+
+def time_route(app, test_client, method, path, payload, runs):
+    """runs one request runs times, returns (statuses, seconds, calls of the last run)"""
+    statuses, seconds = [], []
+    with captured_calls(app) as captured:
+        for _ in range(runs):
+            started = time.perf_counter()
+            response = send_request(test_client, method, path, payload)
+            seconds.append(time.perf_counter() - started)
+            statuses.append(response.status_code)
+
+    return statuses, seconds, captured['calls']
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def start_scale(loans):
+    """
+    Creates the app, seeds a book of loans and signs a test client in as a loan officer.
+
+    Returns:
+        tuple: (app, test client, fake supabase client, ids of the seeded book)
+    """
+    from main import create_app
+    from structured_logging import configure_logging
+
+    # records are still built and queued at the configured level, only the output is dropped
+    configure_logging(stream=open(os.devnull, 'w'))
+
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['QUERY_BUDGET_MODE'] = 'off'
+
+    client, ids = build_book(loans)
+
+    test_client = app.test_client()
+    with test_client.session_transaction() as session:
+        session['email'] = 'officer0@example.org'
+        session['user_type'] = 'admin'
+        session['user_id'] = ids['user_id']
+        session['user_name'] = 'officer0'
+        session['organisation_id'] = ids['organisation_id']
+
+    return app, test_client, client, ids
+
+
+def call_stats(app, endpoint, calls):
+    """summarises one request's supabase calls next to the route's budgets"""
+    from instrumentation import CALL_BUDGETS, QUERY_BUDGETS, repeated_shapes, describe_shape, query_count
+
+    return {
+        'calls': len(calls),
+        'queries': query_count(calls),
+        'rows': sum(call['rows'] or 0 for call in calls),
+        'bytes': sum(call['bytes'] or 0 for call in calls),
+        'repeated': [f'{count} x {describe_shape(shape)}' for shape, count in repeated_shapes(calls)],
+        'budget': app.config.get('QUERY_BUDGETS', QUERY_BUDGETS).get(endpoint),
+        'call_budget': app.config.get('CALL_BUDGETS', CALL_BUDGETS).get(endpoint)
+    }
+
+
+def benchmark_scale(loans, runs, only=None):
+    """
+    Seeds a book of loans and times every planned route against it.
+
+    Returns:
+        list: One result dict per route
+    """
+    started = time.perf_counter()
+    app, test_client, client, ids = start_scale(loans)
+    print(f'\n{loans:,} loans: seeded in {time.perf_counter() - started:.1f}s')
+
+    results = []
+    for endpoint, method, path, payload in route_plan(ids):
+        if only and endpoint not in only:
+            continue
+
+        statuses, seconds, calls = time_route(app, test_client, method, path, payload, runs)
+        results.append({
+            'endpoint': endpoint,
+            'status': max(statuses),
+            'median': statistics.median(seconds),
+            'p95': percentile(seconds, 0.95),
+            **call_stats(app, endpoint, calls)
+        })
+
+    client.close()
+    return results
+
+
+def route_failures(loans, result):
+    """returns why a route's result fails --check: a 5xx answer or a query or call budget exceeded"""
+    failures = []
+    if result['status'] >= 500:
+        failures.append(f"{result['endpoint']} answered {result['status']} at {loans:,} loans")
+    if result['budget'] is not None and result['queries'] > result['budget']:
+        failures.append(f"{result['endpoint']} made {result['queries']} queries ({result['calls']} supabase "
+                        f"calls) at {loans:,} loans, budget is {result['budget']}")
+    if result['call_budget'] is not None and result['calls'] > result['call_budget']:
+        failures.append(f"{result['endpoint']} made {result['calls']} supabase calls ({result['queries']} "
+                        f"queries) at {loans:,} loans, call budget is {result['call_budget']}")
+    return failures
+
+
+def report(loans, results):
+    """prints the results of one scale and returns its failures"""
+    print(f"{'route':<28}{'status':>7}{'median ms':>11}{'p95 ms':>9}{'calls':>7}{'budget':>8}{'queries':>9}"
+          f"{'budget':>8}{'rows':>9}{'kB':>9}")
+
+    failures = []
+    for result in results:
+        budget = '-' if result['budget'] is None else str(result['budget'])
+        call_budget = '-' if result['call_budget'] is None else str(result['call_budget'])
+        print(f"{result['endpoint']:<28}{result['status']:>7}{result['median'] * 1000:>11.1f}"
+              f"{result['p95'] * 1000:>9.1f}{result['calls']:>7}{call_budget:>8}{result['queries']:>9}{budget:>8}"
+              f"{result['rows']:>9}{result['bytes'] / 1024:>9.1f}")
+        for repeated in result['repeated']:
+            print(f'    N+1: {repeated}')
+
+        failures += route_failures(loans, result)
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--loans', type=int, nargs='+', default=list(DEFAULT_SCALES))
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--route', action='append', help='endpoint to run, repeatable (default: all)')
+    parser.add_argument('--check', action='store_true', help='exit 1 when a route errors or is over budget')
+    args = parser.parse_args()
+
+    failures = []
+    for loans in args.loans:
+        failures += report(loans, benchmark_scale(loans, args.runs, args.route))
+
+    for failure in failures:
+        print(f"{'FAIL' if args.check else 'WARN'}: {failure}", file=sys.stderr)
+
+    return 1 if failures and args.check else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,17 +1,20 @@
-import textwrap
-from http.client import responses
-import uuid
-from datetime import datetime
+from typing import TYPE_CHECKING
+import contextvars
 import mimetypes
+from concurrent.futures import ThreadPoolExecutor
 
-import bcrypt
-from supabase import create_client, Client
-from flask import session
+from database import get_supabase_client, fetch_rows_in, fetch_all_rows, IN_FILTER_CHUNK_SIZE
+from uploads import stream_upload, stream_size, content_digest, already_exists, ContentIndex, STREAMING_THRESHOLD
+from structured_logging import get_logger
 import os
-import random
-import string
-import smtplib
-from email.message import EmailMessage
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+logger = get_logger(__name__)
+
+# concurrent uploads per borrower registration
+UPLOAD_WORKERS = 4
 
 
 def get_content_type(file_extension):
@@ -24,13 +27,8 @@ class Borrowers:
     """contains methods required for the home template"""
 
     def __init__(self):
-        url = os.getenv("SUPABASE_URL")
-        service_role_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-
-        if not url or not service_role_key:
-            raise ValueError("SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY is not set.")
-
-        self.supabase: Client = create_client(url, service_role_key)
+        # shared client for this worker process
+        self.supabase: Client = get_supabase_client()
 
         # email authentication
         self.sender_email = os.getenv('SENDER_EMAIL')
@@ -39,114 +37,33 @@ class Borrowers:
     def exhaust_borrower_information(self):
         """returns full exhausted information for a borrowers"""
         try:
-            # Step 1: Get all borrowers
-            borrowers_response = (
-                self.supabase
-                .table('borrowers')
-                .select('*')
-                .execute()
-            )
+            # Step 1: Get all borrowers, paged past the postgrest row cap
+            borrowers = fetch_all_rows(self.supabase, 'borrowers', '*')
 
-            if not borrowers_response.data:
+            if not borrowers:
                 return []
 
-            borrowers = borrowers_response.data
+            # Step 2: Fetch every related table once and join in memory
+            related = self.load_borrower_relations(borrowers)
 
             for borrower in borrowers:
                 organisation_id = borrower.get('organisation_id')
                 borrower_id = borrower.get('id')
                 next_of_kin_id = borrower.get('next_of_kin_id')
 
-                # Step 2: Add organisation name
-                if organisation_id:
-                    try:
-                        org_response = (
-                            self.supabase
-                            .table('organisations')
-                            .select('name')
-                            .eq('id', organisation_id)
-                            .limit(1)
-                            .execute()
-                        )
+                # Step 3: Add organisation name
+                borrower['organisation_name'] = related['organisation_names'].get(organisation_id)
 
-                        if org_response.data:
-                            borrower['organisation_name'] = org_response.data[0]['name']
-                        else:
-                            borrower['organisation_name'] = None
-                    except Exception as e:
-                        print(f"Error fetching organisation for ID {organisation_id}: {e}")
-                        borrower['organisation_name'] = None
-                else:
-                    borrower['organisation_name'] = None
-
-                # Step 3: Add latest loan repayment balance
+                # Step 4: Add latest loan repayment balance and remaining payments for active loans
                 if borrower_id:
-                    try:
-                        repayment_response = (
-                            self.supabase
-                            .table('loan_repayments')
-                            .select('balance, created_at')
-                            .eq('borrower_id', borrower_id)
-                            .order('created_at', desc=True)
-                            .limit(1)
-                            .execute()
-                        )
-
-                        if repayment_response.data:
-                            borrower['latest_balance'] = repayment_response.data[0]['balance']
-                        else:
-                            borrower['latest_balance'] = None
-                    except Exception as e:
-                        print(f"Error fetching repayments for borrower ID {borrower_id}: {e}")
-                        borrower['latest_balance'] = None
-
-                    # Step 4: Sum of remaining payments for active loans
-                    try:
-                        loans_response = (
-                            self.supabase
-                            .table('loans')
-                            .select('remaining_payments')
-                            .eq('borrower_id', borrower_id)
-                            .eq('status', 'active')
-                            .execute()
-                        )
-
-                        if loans_response.data:
-                            total_remaining = sum(
-                                loan.get('remaining_payments', 0) or 0
-                                for loan in loans_response.data
-                            )
-                            borrower['total_remaining_payments'] = total_remaining
-                        else:
-                            borrower['total_remaining_payments'] = 0
-                    except Exception as e:
-                        print(f"Error fetching loans for borrower ID {borrower_id}: {e}")
-                        borrower['total_remaining_payments'] = 0
+                    borrower['latest_balance'] = related['latest_balances'].get(borrower_id)
+                    borrower['total_remaining_payments'] = related['remaining_payments'].get(borrower_id, 0)
                 else:
                     borrower['latest_balance'] = None
                     borrower['total_remaining_payments'] = 0
 
                 # Step 5: Add next_of_kin info
-                if next_of_kin_id:
-                    try:
-                        nok_response = (
-                            self.supabase
-                            .table('next_of_kins')
-                            .select('first_name, last_name, email, phone')
-                            .eq('id', next_of_kin_id)
-                            .limit(1)
-                            .execute()
-                        )
-
-                        if nok_response.data:
-                            borrower['next_of_kin'] = nok_response.data[0]
-                        else:
-                            borrower['next_of_kin'] = None
-                    except Exception as e:
-                        print(f"Error fetching next of kin for ID {next_of_kin_id}: {e}")
-                        borrower['next_of_kin'] = None
-                else:
-                    borrower['next_of_kin'] = None
+                borrower['next_of_kin'] = related['next_of_kins'].get(next_of_kin_id)
 
             # Step 6: Return enriched borrower data
             return borrowers
@@ -155,12 +72,92 @@ class Borrowers:
             print(f'Exception in exhaust_borrower_information: {e}')
             return []
 
+    def load_borrower_relations(self, borrowers):
+        """
+        Batch loads the organisation, latest repayment, active loan and next of kin data for
+        a list of borrowers, fetching each related table once regardless of borrower count
+
+        Args:
+            borrowers: List of borrower rows
+
+        Returns:
+            dict: Lookup maps keyed by organisation, borrower and next of kin id
+        """
+        organisation_ids = {borrower.get('organisation_id') for borrower in borrowers}
+        borrower_ids = {borrower.get('id') for borrower in borrowers}
+        next_of_kin_ids = {borrower.get('next_of_kin_id') for borrower in borrowers}
+
+        related = {
+            'organisation_names': {},
+            'latest_balances': {},
+            'remaining_payments': {},
+            'next_of_kins': {}
+        }
+
+        # Organisation names
+        try:
+            organisations = self.fetch_related('organisations', 'id, name', 'id', organisation_ids)
+            related['organisation_names'] = {org['id']: org['name'] for org in organisations}
+        except Exception as e:
+            print(f"Error fetching organisations for borrowers: {e}")
+
+        # Latest repayment balance per borrower, one row each from the view in sql/latest_borrower_balances.sql
+        try:
+            balances = self.fetch_related(
+                'latest_borrower_balances', 'borrower_id, balance', 'borrower_id', borrower_ids, order='borrower_id'
+            )
+            related['latest_balances'] = {row['borrower_id']: row['balance'] for row in balances}
+        except Exception as e:
+            print(f"Error fetching repayments for borrowers: {e}")
+
+        # Sum of remaining payments for active loans
+        try:
+            loans = self.fetch_related(
+                'loans', 'id, borrower_id, remaining_payments', 'borrower_id', borrower_ids,
+                filters={'status': 'active'}
+            )
+
+            for loan in loans:
+                borrower_id = loan['borrower_id']
+                related['remaining_payments'][borrower_id] = (
+                    related['remaining_payments'].get(borrower_id, 0) + (loan.get('remaining_payments', 0) or 0)
+                )
+        except Exception as e:
+            print(f"Error fetching loans for borrowers: {e}")
+
+        # Next of kin info
+        try:
+            next_of_kins = self.fetch_related(
+                'next_of_kins', 'id, first_name, last_name, email, phone', 'id', next_of_kin_ids
+            )
+            related['next_of_kins'] = {
+                kin.pop('id'): kin for kin in next_of_kins
+            }
+        except Exception as e:
+            print(f"Error fetching next of kins for borrowers: {e}")
+
+        return related
+
+    def fetch_related(self, table, columns, column, values, filters=None, order='id'):
+        """
+        Fetches the rows of a related table whose column is in values. A few ids are sent as
+        in_() chunks; past one chunk the whole table is paged instead, which takes far fewer
+        round trips than hundreds of id chunks when most borrowers are being listed.
+        """
+        values = {value for value in values if value is not None}
+        if len(values) <= IN_FILTER_CHUNK_SIZE:
+            return fetch_rows_in(self.supabase, table, columns, column, values, filters=filters, order=order)
+
+        rows = fetch_all_rows(self.supabase, table, columns, filters=filters, order=order)
+        return [row for row in rows if row.get(column) in values]
+
     def upload_borrower_file(self, file_object, file_name, document_type):
         """
         Upload a file to the borrower-files bucket in Supabase
 
         Args:
-            file_object: File object or file content (bytes)
+            file_object: File object, file content (bytes) or an uploaded werkzeug FileStorage,
+                         which is streamed in chunks when it is larger than STREAMING_THRESHOLD
             file_name: Original filename
             document_type: Type of document ('identity', 'residence', 'photo')
 
@@ -190,32 +187,64 @@ class Borrowers:
                     "message": "Document type is required"
                 }
 
-            # Generate unique filename to avoid conflicts
-            file_extension = os.path.splitext(file_name)[1]
-            unique_id = str(uuid.uuid4())
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-
-            # Create file path (all files go to the same bucket without borrower_id organization)
-            file_path = f"{document_type}/{timestamp}_{unique_id}{file_extension}"
-
-            # Upload file to bucket
-            response = self.supabase.storage.from_("borrower-files").upload(
-                path=file_path,
-                file=file_object,
-                file_options={
-                    "content-type": get_content_type(file_extension),
-                    "upsert": False  # Don't overwrite existing files
+            # Name the file after its content so identical documents share one object
+            file_extension = os.path.splitext(file_name)[1].lower()
+            file_path = f"{document_type}/{content_digest(file_object)}{file_extension}"
+
+            # Already in the bucket: reuse it without sending any bytes
+            content_index = ContentIndex()
+            file_url = content_index.get("borrower-files", file_path)
+            if file_url:
+                return {
+                    "success": True,
+                    "file_url": file_url,
+                    "file_path": file_path,
+                    "document_type": document_type,
+                    "original_filename": file_name,
+                    "deduplicated": True,
+                    "message": "File already stored"
                 }
-            )
 
-            # Check if upload was successful
-            if hasattr(response, 'data') and response.data:
+            # Upload file to bucket without overwriting, other borrower_files rows may share the object
+            deduplicated = False
+            try:
+                if hasattr(file_object, 'stream') and stream_size(file_object.stream) > STREAMING_THRESHOLD:
+                    # large uploaded scans are sent in chunks straight from the request stream
+                    response = stream_upload(
+                        bucket="borrower-files",
+                        object_path=file_path,
+                        stream=file_object.stream,
+                        content_type=get_content_type(file_extension),
+                        upsert=False
+                    )
+                else:
+                    response = self.supabase.storage.from_("borrower-files").upload(
+                        path=file_path,
+                        file=file_object.read() if hasattr(file_object, 'stream') else file_object,
+                        file_options={
+                            "content-type": get_content_type(file_extension),
+                            "upsert": "false"
+                        }
+                    )
+            except Exception as e:
+                if not already_exists(e):
+                    raise
+                # the object was stored before the index knew of it, the same content is already there
+                response, deduplicated = None, True
+
+            error = getattr(response, 'error', None)
+            if error and (already_exists(response) or already_exists(error)):
+                response, deduplicated, error = None, True, None
+
+            # Check if upload was successful, the storage client raises or sets error on failure
+            if not error:
                 # Get public URL for the uploaded file
                 public_url_response = self.supabase.storage.from_("borrower-files").get_public_url(file_path)
 
                 # Extract the actual URL string from the response
                 file_url = public_url_response.get('publicUrl') if hasattr(public_url_response, 'get') else str(
                     public_url_response)
+                content_index.put("borrower-files", file_path, file_url)
 
                 return {
                     "success": True,
@@ -223,7 +252,8 @@ class Borrowers:
                     "file_path": file_path,
                     "document_type": document_type,
                     "original_filename": file_name,
-                    "message": "File uploaded successfully"
+                    "deduplicated": deduplicated,
+                    "message": "File already stored" if deduplicated else "File uploaded successfully"
                 }
             else:
                 # Check for error in response
@@ -244,6 +274,44 @@ class Borrowers:
                 "message": f"Error uploading file: {str(e)}"
             }
 
+    def upload_borrower_files(self, uploads):
+        """
+        Upload several files to the borrower-files bucket at once on a bounded thread pool.
+        The batch is all or nothing: if any upload fails, every result is reported as failed so no
+        borrower_files row is written. Objects that did upload stay in the bucket: they are named
+        after their content and may already back other borrowers' rows, so they are never removed.
+
+        Args:
+            uploads: List of dicts with the upload_borrower_file arguments
+                     (file_object, file_name, document_type)
+
+        Returns:
+            list: One upload_borrower_file result per upload, in the same order
+        """
+        if not uploads:
+            return []
+
+        # each upload runs in a copy of this context, so the request's storage calls are still recorded
+        contexts = [contextvars.copy_context() for _ in uploads]
+
+        with ThreadPoolExecutor(max_workers=min(UPLOAD_WORKERS, len(uploads))) as executor:
+            results = list(executor.map(
+                lambda upload, context: context.run(self.upload_borrower_file, **upload), uploads, contexts
+            ))
+
+        if all(result["success"] for result in results):
+            return results
+
+        return [
+            result if not result["success"] else {
+                "success": False,
+                "error": "Upload rolled back because another file in the batch failed",
+                "message": "Upload rolled back",
+                "original_filename": result["original_filename"]
+            }
+            for result in results
+        ]
+
     def upload_multiple_borrower_files(self, files_data):
         """
         Upload multiple files for a borrower
@@ -344,7 +412,8 @@ class Borrowers:
                 }
             }
 
-            # Process each file from the form
+            # Collect each file from the form
+            pending = []
             for i in range(total_files):
                 file_key = f'file_{i}'
                 file_type_key = f'file_{i}_type'
@@ -362,16 +431,19 @@ class Borrowers:
                     })
                     continue
 
+                pending.append((i, original_filename, document_type, {
+                    "file_object": file_object,
+                    "file_name": original_filename or f"file_{i}",
+                    "document_type": document_type
+                }))
+
+            # Upload all files to the bucket at once
+            upload_results = self.upload_borrower_files([upload for _, _, _, upload in pending])
+
+            for (i, original_filename, document_type, _), upload_result in zip(pending, upload_results):
                 # Map frontend document types to database field names
                 db_document_type = "nrc_files" if document_type == "identity" else "proof_residency_files"
 
-                # Upload file to bucket and get URL
-                upload_result = self.upload_borrower_file(
-                    file_object=file_object,
-                    file_name=original_filename or f"file_{i}",
-                    document_type=document_type
-                )
-
                 if upload_result["success"]:
                     uploaded_results["successful_uploads"].append(upload_result)
                     # Store URL in appropriate category for database insertion
@@ -429,9 +501,16 @@ class Borrowers:
                 current_nrc = existing_record.data[0].get('nrc_files', []) or []
                 current_residence = existing_record.data[0].get('proof_residency_files', []) or []
 
-                # Merge new files with existing ones
-                updated_nrc = current_nrc + file_urls.get('nrc_files', [])
-                updated_residence = current_residence + file_urls.get('proof_residency_files', [])
+                # Merge new files with existing ones, a re-submitted document is only listed once
+                updated_nrc = list(dict.fromkeys(current_nrc + file_urls.get('nrc_files', [])))
+                updated_residence = list(dict.fromkeys(current_residence + file_urls.get('proof_residency_files', [])))
+
+                if updated_nrc == current_nrc and updated_residence == current_residence:
+                    return {
+                        "success": True,
+                        "database_record": existing_record.data[0],
+                        "message": "File URLs already saved"
+                    }
 
                 update_data = {
                     "nrc_files": updated_nrc,
@@ -449,8 +528,8 @@ class Borrowers:
                 # Create new record
                 new_record = {
                     "borrower_id": borrower_id,
-                    "nrc_files": file_urls.get('nrc_files', []),
-                    "proof_residency_files": file_urls.get('proof_residency_files', [])
+                    "nrc_files": list(dict.fromkeys(file_urls.get('nrc_files', []))),
+                    "proof_residency_files": list(dict.fromkeys(file_urls.get('proof_residency_files', [])))
                 }
 
                 db_response = (
@@ -642,7 +721,8 @@ class Borrowers:
                 "failed_uploads": []
             }
 
-            # Process each file
+            # Collect each file
+            pending = []
             for i in range(total_files):
                 file_key = f'file_{i}'
                 file_type_key = f'file_{i}_type'
@@ -661,13 +741,16 @@ class Borrowers:
                     })
                     continue
 
-                # Upload to Supabase bucket
-                upload_result = self.upload_borrower_file(
-                    file_object=file_object.read(),  # Read the file content
-                    file_name=original_filename or file_object.filename,
-                    document_type=document_type
-                )
+                pending.append((i, original_filename or file_object.filename, document_type, {
+                    "file_object": file_object,  # Streamed from the request, not read into memory here
+                    "file_name": original_filename or file_object.filename,
+                    "document_type": document_type
+                }))
+
+            # Upload all files to the Supabase bucket at once
+            bucket_results = self.upload_borrower_files([upload for _, _, _, upload in pending])
 
+            for (i, file_name, document_type, _), upload_result in zip(pending, bucket_results):
                 if upload_result["success"]:
                     upload_results["successful_uploads"].append(upload_result)
 
@@ -680,7 +763,7 @@ class Borrowers:
                 else:
                     upload_results["failed_uploads"].append({
                         "file_index": i,
-                        "file_name": original_filename or file_object.filename,
+                        "file_name": file_name,
                         "error": upload_result["error"],
                         "message": upload_result.get("message", "Upload failed")
                     })
@@ -835,7 +918,9 @@ class Borrowers:
                 request_files, form_data, borrower_id
             )
 
-            print(f"File upload result: {file_upload_result}")
+            logger.debug('borrower files uploaded', borrower_id=borrower_id,
+                         count=file_upload_result.get('files_processed', 0),
+                         failed=file_upload_result.get('files_failed', 0))
 
             # Return complete result
             return {
@@ -1017,7 +1102,9 @@ class Borrowers:
                 request_files, form_data, borrower_id
             )
 
-            print(f"File upload result: {file_upload_result}")
+            logger.debug('borrower files uploaded', borrower_id=borrower_id,
+                         count=file_upload_result.get('files_processed', 0),
+                         failed=file_upload_result.get('files_failed', 0))
 
             # Return complete result
             return {
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import threading
+import time
+
+
+# seconds a cached value is trusted without an invalidation. Settings.update_nominal_rate
+# invalidates the rate for every worker on this host at once; the ttl bounds how long a rate
+# edited outside the app (supabase dashboard or sql) or on another host takes to arrive
+CONFIG_TTL = 60
+
+# replaced on every invalidation so the other gunicorn workers on this host drop their copies
+CONFIG_VERSION_FILE = os.getenv('CONFIG_VERSION_FILE') or os.path.join(
+    tempfile.gettempdir(), 'bridgetrust_config.version'
+)
+
+_config_cache = {}
+_config_lock = threading.Lock()
+
+
+def config_version():
+    """
+    Returns the current config version as seen on disk.
+
+    The version file is replaced (never edited in place) on invalidation, so its inode and
+    mtime change together. A stat is enough to notice, no database round trip is needed.
+    """
+    try:
+        stat = os.stat(CONFIG_VERSION_FILE)
+        return stat.st_ino, stat.st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def get_config(key, loader, ttl=CONFIG_TTL):
+    """
+    Returns a cached config value, calling the loader only when the value is missing,
+    older than the ttl, or was invalidated by any worker since it was loaded.
+
+    Args:
+        key: Name of the config value
+        loader: Function returning the value from the database, None is never cached
+        ttl: Seconds before the value is reloaded regardless of invalidations
+
+    Returns:
+        The config value, or None if the loader failed
+    """
+    version = config_version()
+    entry = _config_cache.get(key)
+
+    if entry is not None and entry['version'] == version and time.monotonic() - entry['loaded_at'] < ttl:
+        return entry['value']
+
+    with _config_lock:
+        # another thread may have reloaded it while we waited
+        entry = _config_cache.get(key)
+        if entry is not None and entry['version'] == version and time.monotonic() - entry['loaded_at'] < ttl:
+            return entry['value']
+
+        value = loader()
+        if value is not None:
+            _config_cache[key] = {'value': value, 'version': version, 'loaded_at': time.monotonic()}
+
+        return value
+
+
+def invalidate_config():
+    """drops every cached config value in this worker and bumps the version seen by the others"""
+    with _config_lock:
+        _config_cache.clear()
+
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(CONFIG_VERSION_FILE))
+            with os.fdopen(fd, 'w') as version_file:
+                version_file.write(str(time.time_ns()))
+            os.replace(temp_path, CONFIG_VERSION_FILE)
+
+        except OSError as e:
+            # the ttl still bounds how long the other workers serve the old value
+            print(f'Exception while bumping config version: {e}')
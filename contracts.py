@@ -0,0 +1,105 @@
+import os
+import string
+import threading
+
+
+# the loan agreement every contract is rendered from
+CONTRACT_TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'contract.txt')
+
+
+class CompiledTemplate:
+    """
+    A str.format template parsed once into literal text and replacement fields.
+    Rendering walks the parsed pieces, so the template text is never scanned again.
+
+    A format spec with fields of its own ({amount:{width}}) is compiled as a nested template
+    and filled before the value is formatted, one level deep like str.format allows.
+    """
+
+    formatter = string.Formatter()
+
+    def __init__(self, text, nesting=1):
+        if nesting < 0:
+            raise ValueError('Max string recursion exceeded')
+
+        self.pieces = []
+        for literal, field_name, format_spec, conversion in self.formatter.parse(text):
+            if format_spec and '{' in format_spec:
+                format_spec = CompiledTemplate(format_spec, nesting - 1)
+            self.pieces.append((literal, field_name, format_spec, conversion))
+
+    def render(self, values):
+        """fills the template like text.format(**values), a missing value raises KeyError"""
+        parts = []
+        for literal, field_name, format_spec, conversion in self.pieces:
+            parts.append(literal)
+            if field_name is None:
+                continue
+
+            value, _ = self.formatter.get_field(field_name, (), values)
+            value = self.formatter.convert_field(value, conversion)
+            if isinstance(format_spec, CompiledTemplate):
+                format_spec = format_spec.render(values)
+            parts.append(self.formatter.format_field(value, format_spec))
+
+        return ''.join(parts)
+
+
+class ContractRenderer:
+    """
+    Renders contracts from a template file in memory.
+
+    The template is read and compiled on first use and recompiled only when the file's
+    mtime or size changes, so an edited template is picked up without a restart.
+    """
+
+    def __init__(self, template_path=CONTRACT_TEMPLATE_PATH):
+        self.template_path = template_path
+        self.compiled = None
+        self.signature = None
+        self.lock = threading.Lock()
+
+    def template(self):
+        """returns the compiled template, recompiling it if the file changed since it was read"""
+        stat = os.stat(self.template_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        if self.compiled is not None and self.signature == signature:
+            return self.compiled
+
+        with self.lock:
+            if self.compiled is None or self.signature != signature:
+                with open(self.template_path, 'r') as file:
+                    self.compiled = CompiledTemplate(file.read())
+                self.signature = signature
+
+            return self.compiled
+
+    def render(self, values):
+        """
+        Renders one contract.
+
+        Args:
+            values: Dict of the template's placeholders
+
+        Returns:
+            str: The filled contract
+        """
+        return self.template().render(values)
+
+    def render_batch(self, values_list):
+        """
+        Renders a contract per dict of values with one check of the template file.
+
+        Args:
+            values_list: List of dicts of the template's placeholders
+
+        Returns:
+            list: The filled contracts, in the order of values_list
+        """
+        template = self.template()
+        return [template.render(values) for values in values_list]
+
+
+# shared by every request in this worker process
+contract_renderer = ContractRenderer()
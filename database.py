@@ -0,0 +1,155 @@
+import os
+import threading
+
+from instrumentation import instrument_client, paged_calls
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_supabase_client():
+    """
+    Returns the shared supabase client for this worker process.
+
+    The client is created once per process and reused by every manager class, so all
+    requests share the same keep-alive connection pool. The process id is checked so a
+    client created before gunicorn forks is never shared between workers. It is wrapped
+    by instrumentation so each request's postgrest and storage calls are recorded.
+    """
+    global _client, _client_pid
+
+    pid = os.getpid()
+    client = _client
+    if client is not None and _client_pid == pid:
+        return client
+
+    with _client_lock:
+        if _client is None or _client_pid != pid:
+            url = os.getenv("SUPABASE_URL")
+            service_role_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+            if not url or not service_role_key:
+                raise ValueError("SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY is not set.")
+
+            # the sdk is imported here rather than at module level, it is slow to import and
+            # only needed once a request actually talks to the database
+            from supabase import create_client
+
+            _client = instrument_client(create_client(url, service_role_key))
+            _client_pid = pid
+
+        return _client
+
+
+def set_supabase_client(client):
+    """
+    Installs a client to be handed out instead of the real one (e.g. a fake backend in tests),
+    instrumented like the real one. Returns the previously installed client so it can be restored.
+    """
+    global _client, _client_pid
+
+    with _client_lock:
+        previous = _client
+        _client = instrument_client(client)
+        _client_pid = os.getpid() if client is not None else None
+
+    return previous
+
+
+def reset_supabase_client():
+    """drops the shared client so the next call creates a fresh one"""
+    set_supabase_client(None)
+
+
+# ids per in_() filter, keeps the request url well under the gateway limit
+IN_FILTER_CHUNK_SIZE = 200
+
+# postgrest caps every response at this many rows, so larger results are paged
+PAGE_SIZE = 1000
+
+
+@paged_calls()
+def fetch_rows_in(supabase, table, columns, column, values, filters=None, order='id', desc=False):
+    """
+    Fetches every row of a table whose column is in the given values.
+
+    The values are de-duplicated and sent in chunks with in_() filters, and each chunk is
+    paged with range() so no rows are lost to the postgrest row cap. The number of round
+    trips depends on the number of ids and rows, never on how the caller loops over them.
+
+    Args:
+        supabase: Supabase client
+        table: Table name
+        columns: Columns to select
+        column: Column the values are matched against
+        values: Iterable of values to match
+        filters: Optional dict of extra eq() filters
+        order: Column to order each chunk by so its pages are stable, None for tables without id
+        desc: Order descending when True
+
+    Returns:
+        list: Matching rows
+    """
+    unique_values = list(dict.fromkeys(value for value in values if value is not None))
+    rows = []
+
+    for start in range(0, len(unique_values), IN_FILTER_CHUNK_SIZE):
+        chunk = unique_values[start:start + IN_FILTER_CHUNK_SIZE]
+        offset = 0
+
+        while True:
+            query = supabase.table(table).select(columns).in_(column, chunk)
+
+            for key, value in (filters or {}).items():
+                query = query.eq(key, value)
+
+            if order:
+                query = query.order(order, desc=desc)
+
+            response = query.range(offset, offset + PAGE_SIZE - 1).execute()
+            page = response.data or []
+            rows.extend(page)
+
+            if len(page) < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+
+    return rows
+
+
+@paged_calls()
+def fetch_all_rows(supabase, table, columns, filters=None, order='id'):
+    """
+    Fetches every row of a table, paging with range() past the postgrest row cap.
+
+    Args:
+        supabase: Supabase client
+        table: Table name
+        columns: Columns to select
+        filters: Optional dict of eq() filters
+        order: Column to order by so pages are stable
+
+    Returns:
+        list: All matching rows
+    """
+    rows = []
+    offset = 0
+
+    while True:
+        query = supabase.table(table).select(columns)
+
+        for key, value in (filters or {}).items():
+            query = query.eq(key, value)
+
+        if order:
+            query = query.order(order)
+
+        response = query.range(offset, offset + PAGE_SIZE - 1).execute()
+        page = response.data or []
+        rows.extend(page)
+
+        if len(page) < PAGE_SIZE:
+            return rows
+        offset += PAGE_SIZE
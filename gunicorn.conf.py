@@ -0,0 +1,69 @@
+import gc
+import os
+import subprocess
+import sys
+import threading
+import time
+
+
+# gunicorn -c gunicorn.conf.py
+wsgi_app = 'main:create_app(preload=True)'
+
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', '8000')}")
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+
+# load the app and its heavy modules once in the master, then fork the workers from it.
+# safe with the shared supabase client: it is keyed by pid and created after the fork.
+preload_app = True
+
+
+def when_ready(server):
+    """runs in the master after the app is loaded, before the first worker is forked"""
+    # move the preloaded objects out of the collector's generations, otherwise the first
+    # collection in each worker writes to their pages and un-shares them
+    gc.freeze()
+
+
+# the job worker (flask --app main run-jobs) is started by the master next to the web workers:
+# the queue is a sqlite file (jobs.JOBS_DB_PATH), so the two must share a host and volume, which
+# separate process types on a Procfile platform do not. RUN_JOB_WORKER=0 leaves it to a
+# worker started separately on the same host.
+RUN_JOB_WORKER = os.getenv('RUN_JOB_WORKER', '1') != '0'
+
+# seconds before a job worker that exited is started again
+JOB_WORKER_RESTART_DELAY = 5
+
+_job_worker = None
+_stopping = threading.Event()
+
+
+def supervise_job_worker(server):
+    """keeps one job worker process running until the master exits"""
+    global _job_worker
+
+    while not _stopping.is_set():
+        _job_worker = subprocess.Popen([sys.executable, '-m', 'flask', '--app', 'main', 'run-jobs'])
+        server.log.info('Started job worker (pid: %s)', _job_worker.pid)
+        _job_worker.wait()
+
+        if not _stopping.is_set():
+            server.log.error('Job worker (pid: %s) exited, restarting', _job_worker.pid)
+            time.sleep(JOB_WORKER_RESTART_DELAY)
+
+
+def on_starting(server):
+    """runs in the master before the app is loaded"""
+    if RUN_JOB_WORKER:
+        threading.Thread(target=supervise_job_worker, args=(server,), name='job-worker', daemon=True).start()
+
+
+def on_exit(server):
+    """runs in the master just before it exits"""
+    _stopping.set()
+    if _job_worker is not None and _job_worker.poll() is None:
+        _job_worker.terminate()
+        try:
+            _job_worker.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            _job_worker.kill()
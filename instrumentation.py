@@ -0,0 +1,439 @@
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+
+# a query shape repeated this many times in one request is reported as an N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', '3'))
+
+# 'log' reports routes over budget, 'raise' fails the request (for tests), 'off' skips the checks
+QUERY_BUDGET_MODE = os.getenv('QUERY_BUDGET_MODE', 'log')
+
+# endpoint -> maximum queries per request (see query_count, a paged fetch is one query),
+# unlisted routes are unchecked. Measured with benchmarks/route_benchmarks.py, which must pass
+# --check, so one extra round trip is reported. Routes that price loans or show the nominal
+# rate have one more for its reload from the config cache every CONFIG_TTL seconds.
+# override or extend with app.config['QUERY_BUDGETS']
+QUERY_BUDGETS = {
+    'home': 5,
+    'get_all_interest_data': 1,
+    'get_interest_data': 1,
+    'organisation_transactions': 4,
+    'organisation_borrowers': 8,
+    'borrower_management': 6,
+    'get_borrower_data': 4,
+    'loan_information': 9,
+    'loan_application': 1,
+    'loan_application_summary': 4,
+    'loan_quotes': 1,
+    'create_loan_request': 3,
+    'loan_approvals': 6,
+    'loan_request_information': 8,
+    'wallet': 2,
+    'withdraw': 2,
+    'account_info_settings': 2,
+    'user_settings': 1,
+    'partner_settings': 1
+}
+
+# endpoint -> maximum supabase calls per request, every page and chunk of a paged fetch
+# counted. On a book where each query fits in one page this is the query count, so a route
+# whose round trips grow with the book (loading a table page by page, in_() chunks per 200
+# ids) is reported even though its query count stays the same.
+# override or extend with app.config['CALL_BUDGETS']
+CALL_BUDGETS = {
+    'home': 5,
+    'get_all_interest_data': 1,
+    'get_interest_data': 1,
+    'organisation_transactions': 4,
+    'organisation_borrowers': 8,
+    'borrower_management': 6,
+    'get_borrower_data': 4,
+    'loan_information': 9,
+    'loan_application': 1,
+    'loan_application_summary': 4,
+    'loan_quotes': 1,
+    'create_loan_request': 3,
+    'loan_approvals': 6,
+    'loan_request_information': 8,
+    'wallet': 2,
+    'withdraw': 2,
+    'account_info_settings': 2,
+    'user_settings': 1,
+    'partner_settings': 1
+}
+
+# storage calls that go over the network, get_public_url only builds a string
+STORAGE_OPERATIONS = {'upload', 'update', 'download', 'remove', 'list', 'move', 'copy', 'create_signed_url'}
+
+# postgrest methods that decide what a query does
+QUERY_OPERATIONS = ('insert', 'upsert', 'update', 'delete', 'select')
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """raised after a request when QUERY_BUDGET_MODE is 'raise' and the route made too many queries or calls"""
+
+
+def record_call(kind, target, operation, shape, rows=None, nbytes=None, seconds=0.0, error=None):
+    """
+    Records one supabase call against the current request. Calls made outside a request
+    (job worker, CLI commands) are not recorded.
+
+    Args:
+        kind: 'postgrest' or 'storage'
+        target: Table or bucket name
+        operation: select, insert, update, upsert, delete or the storage method
+        shape: Hashable description of the call without its values, equal for repeated queries
+        rows: Rows returned or affected
+        nbytes: Size of the payload sent or received
+        seconds: Wall time of the call
+        error: Exception message if the call failed
+    """
+    if not has_request_context():
+        return
+
+    calls = g.setdefault('supabase_calls', [])
+    calls.append({
+        'kind': kind,
+        'target': target,
+        'operation': operation,
+        'shape': shape,
+        'rows': rows,
+        'bytes': nbytes,
+        'seconds': seconds,
+        'error': error,
+        'paged_query': g.get('supabase_paged_query')
+    })
+
+
+@contextmanager
+def paged_calls():
+    """
+    Groups the calls made inside as the pages and chunks of one logical query (see
+    database.fetch_all_rows and fetch_rows_in). The group counts once against the route's
+    budget and only its first call is checked for N+1, so the number of pages, which grows
+    with the data, neither breaks budgets nor looks like a loop of queries.
+    """
+    if not has_request_context() or g.get('supabase_paged_query') is not None:
+        yield
+        return
+
+    g.supabase_paged_queries = g.get('supabase_paged_queries', 0) + 1
+    g.supabase_paged_query = g.supabase_paged_queries
+    try:
+        yield
+    finally:
+        g.supabase_paged_query = None
+
+
+def record_response_size(response):
+    """
+    httpx response hook on the postgrest session, keeps the size of the body the current
+    request's last postgrest call received: its Content-Length, or the body read once when
+    the response is chunked. The decoded rows are never encoded again to measure them.
+    """
+    if not has_request_context():
+        return
+
+    length = response.headers.get('content-length')
+    if length is None:
+        response.read()
+        length = len(response.content)
+    g.supabase_response_bytes = int(length)
+
+
+def take_response_size(response):
+    """
+    Returns the body size of the postgrest response just received, from record_response_size,
+    or the content_length a client without an http session (the benchmark fake) sets itself.
+    """
+    nbytes = g.pop('supabase_response_bytes', None) if has_request_context() else None
+    return nbytes if nbytes is not None else getattr(response, 'content_length', None)
+
+
+class QueryProxy:
+    """
+    Wraps a postgrest request builder, remembering the methods called on it so that
+    execute() can record the table, operation and shape of the query.
+    """
+
+    def __init__(self, builder, table, steps=()):
+        self._builder = builder
+        self._table = table
+        self._steps = steps
+
+    def __getattr__(self, name):
+        attribute = getattr(self._builder, name)
+        if not callable(attribute):
+            # properties such as not_ hand back a builder, keep recording through them
+            if hasattr(attribute, 'execute'):
+                return QueryProxy(attribute, self._table, self._steps + ((name, ''),))
+            return attribute
+
+        def call(*args, **kwargs):
+            # the shape keeps column names (first string argument) and drops the values,
+            # except the bounds of range() so the pages of one query have different shapes
+            if name == 'range':
+                column = ':'.join(str(arg) for arg in args)
+            else:
+                column = args[0] if args and isinstance(args[0], str) else ''
+            result = attribute(*args, **kwargs)
+            if hasattr(result, 'execute'):
+                return QueryProxy(result, self._table, self._steps + ((name, column),))
+            return result
+
+        return call
+
+    def execute(self):
+        operation = next(
+            (step for step in QUERY_OPERATIONS if any(name == step for name, _ in self._steps)), 'select'
+        )
+        shape = ('postgrest', self._table, self._steps)
+
+        started = time.perf_counter()
+        try:
+            response = self._builder.execute()
+        except Exception as e:
+            record_call('postgrest', self._table, operation, shape, seconds=time.perf_counter() - started,
+                        error=str(e))
+            raise
+
+        seconds = time.perf_counter() - started
+        data = getattr(response, 'data', None)
+        rows = len(data) if isinstance(data, list) else int(bool(data))
+        record_call('postgrest', self._table, operation, shape, rows=rows, nbytes=take_response_size(response),
+                    seconds=seconds)
+        return response
+
+
+class BucketProxy:
+    """wraps a storage bucket and records the calls that reach the storage api"""
+
+    def __init__(self, bucket, name):
+        self._bucket = bucket
+        self._name = name
+
+    def __getattr__(self, name):
+        attribute = getattr(self._bucket, name)
+        if name not in STORAGE_OPERATIONS or not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            shape = ('storage', self._name, name)
+            sent = kwargs.get('file', args[1] if len(args) > 1 else None)
+
+            started = time.perf_counter()
+            try:
+                result = attribute(*args, **kwargs)
+            except Exception as e:
+                record_call('storage', self._name, name, shape, seconds=time.perf_counter() - started, error=str(e))
+                raise
+
+            seconds = time.perf_counter() - started
+            payload = sent if name in ('upload', 'update') else result if name == 'download' else None
+            nbytes = len(payload) if isinstance(payload, (bytes, bytearray)) else 0
+            rows = len(result) if isinstance(result, list) else None
+            record_call('storage', self._name, name, shape, rows=rows, nbytes=nbytes, seconds=seconds)
+            return result
+
+        return call
+
+
+class StorageProxy:
+    """wraps the storage client so every bucket it hands out is recorded"""
+
+    def __init__(self, storage):
+        self._storage = storage
+
+    def from_(self, bucket):
+        return BucketProxy(self._storage.from_(bucket), bucket)
+
+    def list_buckets(self):
+        started = time.perf_counter()
+        buckets = self._storage.list_buckets()
+        record_call('storage', '*', 'list_buckets', ('storage', '*', 'list_buckets'), rows=len(buckets),
+                    seconds=time.perf_counter() - started)
+        return buckets
+
+    def __getattr__(self, name):
+        return getattr(self._storage, name)
+
+
+class InstrumentedClient:
+    """
+    Wraps the shared supabase client so every postgrest and storage call made during a
+    request is recorded in flask.g (see record_call). Everything else is passed through.
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    @property
+    def wrapped(self):
+        """the underlying client"""
+        return self._client
+
+    def watch_responses(self):
+        """
+        Hooks record_response_size into the postgrest http session. The sdk creates a new
+        session after an auth change, so this is checked before every query.
+        """
+        # the benchmark fake has no postgrest session, it reports sizes on its responses
+        session = getattr(getattr(self._client, 'postgrest', None), 'session', None)
+        if session is None:
+            return
+
+        hooks = session.event_hooks['response']
+        if record_response_size not in hooks:
+            hooks.append(record_response_size)
+
+    def table(self, name):
+        self.watch_responses()
+        return QueryProxy(self._client.table(name), name)
+
+    def from_(self, name):
+        self.watch_responses()
+        return QueryProxy(self._client.from_(name), name)
+
+    @property
+    def storage(self):
+        return StorageProxy(self._client.storage)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def instrument_client(client):
+    """returns the client wrapped for recording, a client that is already wrapped is returned as is"""
+    if client is None or isinstance(client, InstrumentedClient):
+        return client
+    return InstrumentedClient(client)
+
+
+def request_calls():
+    """returns the supabase calls recorded for the current request"""
+    return g.get('supabase_calls', []) if has_request_context() else []
+
+
+def query_count(calls):
+    """number of queries the calls make up, the pages and chunks of a paged query count as one"""
+    paged_queries = {call['paged_query'] for call in calls if call.get('paged_query') is not None}
+    return sum(1 for call in calls if call.get('paged_query') is None) + len(paged_queries)
+
+
+def repeated_shapes(calls, threshold=N_PLUS_ONE_THRESHOLD):
+    """
+    Returns (shape, count) for every postgrest query shape repeated at least threshold times,
+    most repeated first. Storage calls are left out, several documents uploaded in one
+    request are expected. A paged query is represented by its first call: its later pages
+    repeat the shape by design, while the same paged query run in a loop is still caught.
+    """
+    counts = Counter()
+    seen_paged_queries = set()
+    for call in calls:
+        if call['kind'] != 'postgrest':
+            continue
+
+        paged_query = call.get('paged_query')
+        if paged_query is not None:
+            if paged_query in seen_paged_queries:
+                continue
+            seen_paged_queries.add(paged_query)
+
+        counts[call['shape']] += 1
+
+    return [(shape, count) for shape, count in counts.most_common() if count >= threshold]
+
+
+def describe_shape(shape):
+    """readable form of a query shape for logs, e.g. postgrest loans select(id).eq(borrower_id)"""
+    kind, target, steps = shape
+    if kind == 'storage':
+        return f'storage {target} {steps}'
+    return f"postgrest {target} " + '.'.join(f'{name}({column})' for name, column in steps)
+
+
+def server_timing(calls):
+    """builds the Server-Timing header value for the recorded calls"""
+    entries = []
+    for kind, label in (('postgrest', 'db'), ('storage', 'storage')):
+        kind_calls = [call for call in calls if call['kind'] == kind]
+        if not kind_calls:
+            continue
+        milliseconds = sum(call['seconds'] for call in kind_calls) * 1000
+        tables = len({call['target'] for call in kind_calls})
+        entries.append(f'{label};dur={milliseconds:.1f};desc="{len(kind_calls)} calls, {tables} targets"')
+
+    return ', '.join(entries)
+
+
+def check_request(endpoint, calls, budgets, mode, call_budgets=None):
+    """
+    Reports repeated query shapes and enforces the route's query and call budgets.
+
+    Returns:
+        list: Problems found, empty when the request is within budget and has no N+1 shape
+    """
+    problems = []
+
+    for shape, count in repeated_shapes(calls):
+        logger.warning('repeated query shape', endpoint=endpoint, count=count, shape=describe_shape(shape))
+        problems.append(f'N+1 on {endpoint}: {count} x {describe_shape(shape)}')
+
+    budget = budgets.get(endpoint)
+    queries = query_count(calls)
+    if budget is not None and queries > budget:
+        tables = dict(Counter(call['target'] for call in calls))
+        logger.warning('query budget exceeded', endpoint=endpoint, queries=queries, calls=len(calls),
+                       budget=budget, tables=tables)
+        problems.append(f'Query budget exceeded on {endpoint}: {queries} queries ({len(calls)} supabase calls), '
+                        f'budget is {budget} ({tables})')
+
+    call_budget = (call_budgets or {}).get(endpoint)
+    if call_budget is not None and len(calls) > call_budget:
+        tables = dict(Counter(call['target'] for call in calls))
+        logger.warning('call budget exceeded', endpoint=endpoint, calls=len(calls), queries=queries,
+                       budget=call_budget, tables=tables)
+        problems.append(f'Call budget exceeded on {endpoint}: {len(calls)} supabase calls ({queries} queries), '
+                        f'budget is {call_budget} ({tables})')
+
+    if mode == 'raise' and problems:
+        raise QueryBudgetExceeded('; '.join(problems))
+
+    return problems
+
+
+def init_instrumentation(app):
+    """
+    Adds the per-request supabase call report to an app: a Server-Timing header on every
+    response, N+1 detection, and the per-route budgets of app.config['QUERY_BUDGETS'] and
+    app.config['CALL_BUDGETS'] enforced according to app.config['QUERY_BUDGET_MODE'].
+    """
+    app.config.setdefault('QUERY_BUDGETS', dict(QUERY_BUDGETS))
+    app.config.setdefault('CALL_BUDGETS', dict(CALL_BUDGETS))
+    app.config.setdefault('QUERY_BUDGET_MODE', QUERY_BUDGET_MODE)
+
+    @app.before_request
+    def start_supabase_calls():
+        g.supabase_calls = []
+
+    @app.after_request
+    def report_supabase_calls(response):
+        calls = request_calls()
+        if calls:
+            timing = server_timing(calls)
+            existing = response.headers.get('Server-Timing')
+            response.headers['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+
+        mode = app.config['QUERY_BUDGET_MODE']
+        if mode != 'off':
+            check_request(request.endpoint, calls, app.config['QUERY_BUDGETS'], mode, app.config['CALL_BUDGETS'])
+
+        return response
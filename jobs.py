@@ -0,0 +1,303 @@
+import json
+import os
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timezone
+
+from loans import Loans
+from notifications import Notifications
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+
+# durable queue shared by the web workers and the job worker on this host, which gunicorn
+# starts next to the web workers (see gunicorn.conf.py) so they always share the file
+JOBS_DB_PATH = os.getenv('JOBS_DB_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jobs.sqlite3')
+
+# attempts before a job is marked failed, retried with a growing delay in between
+MAX_JOB_ATTEMPTS = 5
+RETRY_DELAY = 10
+
+# a running job not finished within this many seconds is assumed lost with its worker
+JOB_LEASE = 300
+
+# seconds the worker sleeps when the queue is empty
+POLL_INTERVAL = 1.0
+
+
+class JobQueue:
+    """a small durable job queue in a sqlite file"""
+
+    def __init__(self, db_path=JOBS_DB_PATH):
+        self.db_path = db_path
+        with self.connect() as connection:
+            connection.execute(
+                """
+                create table if not exists jobs (
+                    id text primary key,
+                    kind text not null,
+                    payload text not null,
+                    state text not null default '{}',
+                    status text not null default 'pending',
+                    attempts integer not null default 0,
+                    run_after real not null default 0,
+                    lease_until real,
+                    error text,
+                    created_at text not null,
+                    updated_at text not null
+                )
+                """
+            )
+            connection.execute('create index if not exists jobs_pending on jobs (status, run_after)')
+
+    def connect(self):
+        """returns a connection that waits on the lock instead of failing when another process writes"""
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        connection.execute('pragma journal_mode=wal')
+        return connection
+
+    def enqueue(self, kind, payload):
+        """adds a job and returns its id"""
+        job_id = str(uuid.uuid4())
+        now = datetime.now(timezone.utc).isoformat()
+
+        with self.connect() as connection:
+            connection.execute(
+                'insert into jobs (id, kind, payload, created_at, updated_at) values (?, ?, ?, ?, ?)',
+                (job_id, kind, json.dumps(payload), now, now)
+            )
+
+        return job_id
+
+    def claim(self):
+        """
+        Claims the next job that is due, or one whose worker died mid-run, and returns it
+        as a dict (payload and state decoded), or None if there is nothing to do.
+        """
+        now = time.time()
+
+        connection = self.connect()
+        try:
+            connection.execute('begin immediate')
+            row = connection.execute(
+                """
+                select * from jobs
+                where (status = 'pending' and run_after <= ?) or (status = 'running' and lease_until < ?)
+                order by created_at
+                limit 1
+                """,
+                (now, now)
+            ).fetchone()
+
+            if row is None:
+                connection.execute('commit')
+                return None
+
+            connection.execute(
+                "update jobs set status = 'running', attempts = attempts + 1, lease_until = ?, updated_at = ? "
+                "where id = ?",
+                (now + JOB_LEASE, datetime.now(timezone.utc).isoformat(), row['id'])
+            )
+            connection.execute('commit')
+
+        except Exception:
+            connection.execute('rollback')
+            raise
+        finally:
+            connection.close()
+
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['state'] = json.loads(job['state'])
+        job['attempts'] += 1
+        return job
+
+    def checkpoint(self, job_id, state):
+        """saves the steps a job has finished, so a retry carries on from there"""
+        self.update(job_id, state=json.dumps(state))
+
+    def complete(self, job_id):
+        """marks a job as done"""
+        self.update(job_id, status='done', lease_until=None, error=None)
+
+    def fail(self, job_id, attempts, error):
+        """
+        Puts a job back in the queue with a growing delay, or marks it failed after the last attempt.
+
+        Returns:
+            bool: True if the job ran out of attempts
+        """
+        if attempts >= MAX_JOB_ATTEMPTS:
+            self.update(job_id, status='failed', lease_until=None, error=error)
+            return True
+
+        self.update(job_id, status='pending', lease_until=None, error=error,
+                    run_after=time.time() + RETRY_DELAY * 2 ** (attempts - 1))
+        return False
+
+    def failed(self):
+        """returns the jobs that ran out of attempts, oldest first, with their payload and last error"""
+        with self.connect() as connection:
+            rows = connection.execute(
+                "select id, kind, payload, attempts, error, created_at, updated_at from jobs "
+                "where status = 'failed' order by created_at"
+            ).fetchall()
+
+        jobs = [dict(row) for row in rows]
+        for job in jobs:
+            job['payload'] = json.loads(job['payload'])
+        return jobs
+
+    def retry(self, job_id):
+        """puts a failed job back in the queue with fresh attempts, its checkpoints are kept"""
+        self.update(job_id, status='pending', attempts=0, run_after=0, lease_until=None)
+
+    def update(self, job_id, **fields):
+        """updates the given columns of a job"""
+        fields['updated_at'] = datetime.now(timezone.utc).isoformat()
+        assignments = ', '.join(f'{column} = ?' for column in fields)
+
+        with self.connect() as connection:
+            connection.execute(f'update jobs set {assignments} where id = ?', (*fields.values(), job_id))
+
+    def get(self, job_id):
+        """returns the public status of a job, or None if it does not exist"""
+        with self.connect() as connection:
+            row = connection.execute(
+                'select id, kind, status, attempts, error, state, created_at, updated_at from jobs where id = ?',
+                (job_id,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        job = dict(row)
+        job['state'] = json.loads(job['state'])
+        return job
+
+
+def process_loan_request_documents(job, queue):
+    """
+    Produces everything a new loan request needs after its row is inserted: the contract and
+    schedule files, the loan_files link, the effective rate and the approval notification.
+    Each step is checkpointed so a retry never uploads or notifies twice.
+    """
+    payload = job['payload']
+    state = job['state']
+    loans_manager = Loans()
+
+    loan_request_id = payload['loan_request_id']
+    loan_summary = payload['loan_summary']
+    borrower_id = payload['borrower_id']
+
+    if 'loan_file_id' not in state:
+        quote = payload.get('quote')
+        if quote:
+            import pandas as pd
+            schedule_df = pd.DataFrame(quote['schedule'])
+            documents = {
+                'borrower_name': quote['borrower_name'],
+                'payment_schedule_df': loans_manager.schedule_export_dataframe(schedule_df, quote['schedule_summary']),
+                'schedule_df': schedule_df,
+                'schedule_summary': quote['schedule_summary'],
+                'contract_content': quote['contract_content']
+            }
+        else:
+            documents = loans_manager.build_loan_documents(loan_summary, borrower_id)
+            if not documents['status']:
+                raise RuntimeError(documents['message'])
+
+        files_result = loans_manager.upload_and_store_loan_files(
+            contract_content=documents['contract_content'],
+            payment_schedule_df=documents['payment_schedule_df'],
+            borrower_name=documents['borrower_name'],
+            borrower_id=borrower_id,
+            schedule_df=documents['schedule_df'],
+            schedule_summary=documents['schedule_summary']
+        )
+        if not files_result['status']:
+            raise RuntimeError(files_result['message'])
+
+        state['loan_file_id'] = files_result['loan_file_id']
+        queue.checkpoint(job['id'], state)
+
+    if not state.get('loan_file_linked'):
+        (
+            loans_manager.supabase
+            .table('loan_requests')
+            .update({'loan_file_id': state['loan_file_id']})
+            .eq('id', loan_request_id)
+            .execute()
+        )
+        state['loan_file_linked'] = True
+        queue.checkpoint(job['id'], state)
+
+    if not state.get('effective_rate_stored'):
+        effective_rate_result = loans_manager.store_effective_rate(
+            loan_id=loan_request_id,
+            principal=loan_summary['principal'],
+            days=loan_summary['loan_tenure_days'],
+            method=loan_summary['method']
+        )
+        if not effective_rate_result['status']:
+            raise RuntimeError(effective_rate_result.get('message'))
+
+        state['effective_rate_stored'] = True
+        queue.checkpoint(job['id'], state)
+
+    if not state.get('notified'):
+        notification_manager = Notifications()
+        notification = notification_manager.formulate_notification(payload['loan_request'])
+        notification_manager.store_notification(notification)
+
+        state['notified'] = True
+        queue.checkpoint(job['id'], state)
+
+
+# job kind -> function(job, queue)
+JOB_HANDLERS = {
+    'loan_request_documents': process_loan_request_documents
+}
+
+
+def run_job(queue, job):
+    """runs one claimed job and records the outcome"""
+    handler = JOB_HANDLERS.get(job['kind'])
+    if handler is None:
+        queue.update(job['id'], status='failed', lease_until=None, error=f"Unknown job kind {job['kind']}")
+        return
+
+    try:
+        handler(job, queue)
+        queue.complete(job['id'])
+        logger.info('job done', job_id=job['id'], kind=job['kind'])
+
+    except Exception as e:
+        logger.exception('job failed', job_id=job['id'], kind=job['kind'], attempts=job['attempts'],
+                         error=str(e))
+        if queue.fail(job['id'], job['attempts'], str(e)):
+            # nothing retries it from here, see flask --app main failed-jobs
+            logger.error('job ran out of attempts', job_id=job['id'], kind=job['kind'],
+                         attempts=job['attempts'], error=str(e),
+                         loan_request_id=job['payload'].get('loan_request_id'))
+
+
+def run_worker(queue=None, once=False):
+    """
+    Runs jobs until interrupted, sleeping while the queue is empty.
+    With once=True it drains the jobs that are due and returns instead.
+    """
+    queue = queue or JobQueue()
+
+    while True:
+        job = queue.claim()
+        if job is None:
+            if once:
+                return
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        run_job(queue, job)
@@ -1,30 +1,31 @@
-import textwrap
+from typing import TYPE_CHECKING
+import logging
+import math
 import uuid
-from http.client import responses
+from bisect import bisect_left
 
-import bcrypt
-from supabase import create_client, Client
-from flask import session
+from database import get_supabase_client, fetch_all_rows, fetch_rows_in
+from config_cache import get_config
+from contracts import contract_renderer
+from structured_logging import get_logger
 import os
-import random
-import string
-import smtplib
-from email.message import EmailMessage
-import pandas as pd
 from datetime import datetime, timedelta
-import os
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+logger = get_logger(__name__)
+
+# scenarios priced by one loan_quotes call, keeps a single request's work bounded while
+# leaving room for a payroll batch (the vectorised pass prices 500 in a few milliseconds)
+MAX_QUOTE_SCENARIOS = int(os.getenv('MAX_QUOTE_SCENARIOS', '1000'))
 
 
 class Loans:
     """contains methods required for the home template"""
     def __init__(self):
-        url = os.getenv("SUPABASE_URL")
-        service_role_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-
-        if not url or not service_role_key:
-            raise ValueError("SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY is not set.")
-
-        self.supabase: Client = create_client(url, service_role_key)
+        # shared client for this worker process
+        self.supabase: Client = get_supabase_client()
 
         # email authentication
         self.sender_email = os.getenv('SENDER_EMAIL')
@@ -153,36 +154,26 @@ class Loans:
         """
         try:
             # Step 1: Get all loan IDs for the organisation
-            loan_response = (
-                self.supabase
-                .table('loans')
-                .select('id')
-                .eq('organisation_id', organisational_id)
-                .execute()
-            )
+            loans = fetch_all_rows(self.supabase, 'loans', 'id', filters={'organisation_id': organisational_id})
 
-            if not loan_response.data:
+            if not loans:
                 return {'total_revenue': 0, 'total_balance': 0}
 
-            loan_ids = [loan['id'] for loan in loan_response.data]
+            loan_ids = [loan['id'] for loan in loans]
 
             if not loan_ids:
                 return {'total_revenue': 0, 'total_balance': 0}
 
-            # Step 2: Get repayments for those loan_ids
-            repayment_response = (
-                self.supabase
-                .table('loan_repayments')
-                .select('payment_amount, balance, loan_id')
-                .in_('loan_id', loan_ids)
-                .execute()
+            # Step 2: Get repayments for those loan_ids, in chunks past the url and row limits
+            repayments = fetch_rows_in(
+                self.supabase, 'loan_repayments', 'id, payment_amount, balance, loan_id', 'loan_id', loan_ids
             )
 
-            if not repayment_response.data:
+            if not repayments:
                 return {'total_revenue': 0, 'total_balance': 0}
 
-            total_revenue = sum([r.get('payment_amount', 0) for r in repayment_response.data])
-            total_balance = sum([r.get('balance', 0) for r in repayment_response.data])
+            total_revenue = sum([r.get('payment_amount', 0) for r in repayments])
+            total_balance = sum([r.get('balance', 0) for r in repayments])
 
             return {
                 'total_revenue': total_revenue,
@@ -200,72 +191,55 @@ class Loans:
         """Returns a list of loan summaries for borrowers in a specific organization"""
         try:
             # Get all loans for the organization
-            loan_response = (
-                self.supabase
-                .table('loans')
-                .select('*')
-                .eq('organisation_id', organisation_id)
-                .execute()
-            )
-
-            loans_data = loan_response.data
-            loan_summaries = []
-
-            for loan in loans_data:
-                loan_id = loan['id']
-                borrower_id = loan['borrower_id']
-                loan_amount = loan['loan_amount']
-                interest = loan['interest_rate']
-                issue_date = loan.get('created_at', '')[:10]
-
-                # Get borrower name
-                borrower_response = (
-                    self.supabase
-                    .table('borrowers')
-                    .select('first_name', 'last_name')
-                    .eq('id', borrower_id)
-                    .single()
-                    .execute()
+            loans_data = fetch_all_rows(self.supabase, 'loans', '*', filters={'organisation_id': organisation_id})
+
+            # Borrower names and repayments of every loan, fetched in bulk rather than per loan
+            borrowers = {
+                borrower['id']: borrower
+                for borrower in fetch_rows_in(
+                    self.supabase, 'borrowers', 'id, first_name, last_name', 'id',
+                    [loan['borrower_id'] for loan in loans_data]
                 )
+            }
 
-                borrower_data = borrower_response.data
-                borrower_name = f"{borrower_data['first_name']} {borrower_data['last_name']}"
-
-                # Get repayment summary
-                repayment_response = (
-                    self.supabase
-                    .table('loan_repayments')
-                    .select('payment_amount, balance')
-                    .eq('loan_id', loan_id)
-                    .execute()
+            repayment_totals = {}
+            for rep in fetch_rows_in(
+                self.supabase, 'loan_repayments', 'id, loan_id, payment_amount, balance', 'loan_id',
+                [loan['id'] for loan in loans_data]
+            ):
+                paid_total, balance_total = repayment_totals.get(rep['loan_id'], (0, 0))
+                repayment_totals[rep['loan_id']] = (
+                    paid_total + rep.get('payment_amount', 0),
+                    balance_total + rep.get('balance', 0)
                 )
 
-                print(f"Repayments for loan {loan_id}: {repayment_response.data}")
-
-                paid_total = 0
-                balance_total = 0
+            loan_summaries = []
 
-                for rep in repayment_response.data:
-                    paid_total += rep.get('payment_amount', 0)
-                    balance_total += rep.get('balance', 0)
+            for loan in loans_data:
+                loan_id = loan['id']
+                borrower_data = borrowers.get(loan['borrower_id'], {})
+                paid_total, balance_total = repayment_totals.get(loan_id, (0, 0))
 
                 # Assemble summary
                 summary = {
                     'loan_id': loan_id,
-                    'borrower_name': borrower_name,
-                    'loan_amount': loan_amount,
-                    'interest': interest,
+                    'borrower_name': f"{borrower_data.get('first_name')} {borrower_data.get('last_name')}",
+                    'loan_amount': loan['loan_amount'],
+                    'interest': loan['interest_rate'],
                     'paid_amount': paid_total,
                     'balance': balance_total,
-                    'issue_date': issue_date
+                    'issue_date': loan.get('created_at', '')[:10]
                 }
 
                 loan_summaries.append(summary)
 
+            # one record per request, not one per loan
+            logger.debug('organisation loans loaded', organisation_id=organisation_id, loans=len(loan_summaries))
+
             return loan_summaries
 
-        except Exception as e:
-            print(f'Exception: {e}')
+        except Exception:
+            logger.exception('organisation loans failed', organisation_id=organisation_id)
             return []
 
     def active_organisational_borrowers(self, organisation_id):
@@ -405,6 +379,10 @@ class Loans:
             }
 
     def loan_packages(self):
+        """returns the nominal rate of return set by the business, cached until the settings change it"""
+        return get_config('nominal_rate', self.load_nominal_rate)
+
+    def load_nominal_rate(self):
         """returns the nominal rate of return set by the business from the database"""
         try:
             response = self.supabase.table('nominal_rate').select('nominal_rate').execute()
@@ -767,6 +745,108 @@ class Loans:
                 'message': str(e)
             }
 
+    def loan_quotes(self, scenarios):
+        """
+        Prices a batch of loan scenarios at once, e.g. a payroll batch for an organisation.
+
+        Args:
+            scenarios: List of dicts with principal, days and method
+
+        Returns:
+            dict: Status, the monthly rate used and one quote per scenario in the same order
+        """
+        try:
+            if not scenarios:
+                raise ValueError("At least one scenario is required")
+            if len(scenarios) > MAX_QUOTE_SCENARIOS:
+                raise ValueError(f"At most {MAX_QUOTE_SCENARIOS} scenarios can be priced at once, "
+                                 f"got {len(scenarios)}")
+
+            principals = []
+            days = []
+            methods = []
+            for index, scenario in enumerate(scenarios):
+                try:
+                    principal = float(scenario['principal'])
+                    duration = float(scenario['days'])
+                except (KeyError, TypeError, ValueError):
+                    raise ValueError(f"Scenario {index} needs a numeric principal and days")
+
+                # float() accepts 'nan' and 'inf', which would price as nonsense rather than fail
+                if not math.isfinite(principal) or not math.isfinite(duration):
+                    raise ValueError(f"Scenario {index} needs a finite principal and days")
+
+                if principal <= 0 or duration < 0:
+                    raise ValueError(f"Scenario {index} needs a positive principal and non-negative days")
+
+                principals.append(principal)
+                days.append(duration)
+                methods.append('simple' if scenario.get('method') == 'simple' else 'amortisation')
+
+            # fetched once for the whole batch (and served from the config cache)
+            monthly_rate_decimal = self.loan_packages()
+            if monthly_rate_decimal is None:
+                return {
+                    'status': False,
+                    'message': 'Could not retrieve monthly rate from database'
+                }
+
+            from portfolio import batch_quotes
+            quotes = batch_quotes(principals, days, methods, monthly_rate_decimal)
+
+            return {
+                'status': True,
+                'monthly_rate': monthly_rate_decimal * 100,
+                'quotes': [
+                    {
+                        'principal': principal,
+                        'loan_tenure_days': int(duration),
+                        'loan_tenure_months': int(months),
+                        'method': method,
+                        'instalments': float(instalment),
+                        'effective_amount': float(interest),
+                        'effective_rate': float(rate),
+                        'recoverable_amount': float(recoverable),
+                        'monthly_interest_amount': float(monthly_interest)
+                    }
+                    for principal, duration, method, months, instalment, interest, rate, recoverable, monthly_interest
+                    in zip(principals, days, methods, quotes['months'], quotes['instalments'],
+                           quotes['total_interest'], quotes['effective_rate'], quotes['recoverable_amount'],
+                           quotes['monthly_interest_amount'])
+                ]
+            }
+
+        except ValueError as ve:
+            logger.debug('loan quotes rejected', scenarios=len(scenarios or []), error=str(ve))
+            return {
+                'status': False,
+                'message': f'Invalid parameter: {str(ve)}'
+            }
+        except Exception as e:
+            logger.exception('loan quotes failed', scenarios=len(scenarios or []))
+            return {
+                'status': False,
+                'message': str(e)
+            }
+
+    def quote_is_current(self, quote, form_data):
+        """
+        Checks that a stored quote is for the loan being requested and was priced at the
+        current nominal rate, so it can be used in place of recomputing the application.
+        """
+        try:
+            summary = quote['loan_summary']
+            return (
+                float(form_data.get('principal')) == float(summary['principal'])
+                and int(float(form_data.get('days'))) == int(summary['loan_tenure_days'])
+                and form_data.get('method') == summary['method']
+                and quote['monthly_rate'] == self.loan_packages()
+            )
+
+        except (KeyError, TypeError, ValueError) as e:
+            print(f'Exception while checking quote: {e}')
+            return False
+
     def generate_payment_schedule_dataframe(self, principal, days, method='amortisation', start_date=None,
                                             file_path=None):
         """
@@ -780,7 +860,7 @@ class Loans:
             file_path: Where to save the CSV (defaults to current directory)
 
         Returns:
-            dict: Status and file path information
+            dict: Status, the schedule dataframe (numeric columns only), its summary and file path information
         """
         try:
             # Convert parameters to appropriate types
@@ -815,118 +895,30 @@ class Loans:
             elif isinstance(start_date, str):
                 start_date = datetime.strptime(start_date, '%Y-%m-%d')
 
-            # Prepare schedule data
-            schedule_data = []
-            remaining_balance = principal
-
-            if method == 'simple':
-                # Simple Interest: Interest is calculated on original principal each month
-                monthly_interest_amount = principal * monthly_rate_decimal
-                monthly_principal_payment = monthly_payment - monthly_interest_amount
-
-                for month in range(1, months + 1):
-                    payment_date = start_date + timedelta(days=30 * month)
+            # Build the schedule columns as typed arrays (pandas is imported on first use, not at boot)
+            import pandas as pd
+            from portfolio import quote_schedule
 
-                    # For simple interest, adjust last payment to clear remaining balance
-                    if month == months:
-                        principal_payment = remaining_balance
-                        interest_payment = monthly_payment - principal_payment
-                    else:
-                        principal_payment = monthly_principal_payment
-                        interest_payment = monthly_interest_amount
-
-                    remaining_balance -= principal_payment
-
-                    schedule_data.append({
-                        'Payment_Number': month,
-                        'Payment_Date': payment_date.strftime('%Y-%m-%d'),
-                        'Beginning_Balance': round(remaining_balance + principal_payment, 2),
-                        'Monthly_Payment': round(monthly_payment, 2),
-                        'Interest_Payment': round(interest_payment, 2),
-                        'Principal_Payment': round(principal_payment, 2),
-                        'Ending_Balance': round(max(0, remaining_balance), 2),
-                        'Interest_Rate_Applied': round(monthly_rate_decimal * 100, 4)
-                    })
+            df = pd.DataFrame(quote_schedule(principal, months, monthly_rate_decimal, monthly_payment, method,
+                                             start_date))
 
-            else:
-                # Amortisation: Interest calculated on remaining balance
-                for month in range(1, months + 1):
-                    payment_date = start_date + timedelta(days=30 * month)
-
-                    # Calculate interest on remaining balance
-                    interest_payment = remaining_balance * monthly_rate_decimal
-                    principal_payment = monthly_payment - interest_payment
-
-                    # Adjust last payment to clear any remaining balance due to rounding
-                    if month == months:
-                        principal_payment = remaining_balance
-                        interest_payment = monthly_payment - principal_payment
-
-                    remaining_balance -= principal_payment
-
-                    schedule_data.append({
-                        'Payment_Number': month,
-                        'Payment_Date': payment_date.strftime('%Y-%m-%d'),
-                        'Beginning_Balance': round(remaining_balance + principal_payment, 2),
-                        'Monthly_Payment': round(monthly_payment, 2),
-                        'Interest_Payment': round(interest_payment, 2),
-                        'Principal_Payment': round(principal_payment, 2),
-                        'Ending_Balance': round(max(0, remaining_balance), 2),
-                        'Interest_Rate_Applied': round(monthly_rate_decimal * 100, 4)
-                    })
-
-            # Create DataFrame
-            df = pd.DataFrame(schedule_data)
-
-            # Calculate effective rate from the schedule
-            total_payments = df['Monthly_Payment'].sum()
-            total_interest = df['Interest_Payment'].sum()
+            total_payments = float(df['Monthly_Payment'].sum())
+            total_interest = float(df['Interest_Payment'].sum())
             effective_rate = (total_interest / principal) * 100
 
-            # Add summary rows at the end
-            totals_row = {
-                'Payment_Number': 'TOTALS',
-                'Payment_Date': '',
-                'Beginning_Balance': '',
-                'Monthly_Payment': df['Monthly_Payment'].sum(),
-                'Interest_Payment': df['Interest_Payment'].sum(),
-                'Principal_Payment': df['Principal_Payment'].sum(),
-                'Ending_Balance': '',
-                'Interest_Rate_Applied': ''
+            # kept out of the frame so every column stays numeric, see schedule_export_dataframe
+            summary = {
+                'principal': principal,
+                'days': days,
+                'months': months,
+                'method': method,
+                'monthly_rate': monthly_rate_percent,
+                'effective_rate': effective_rate,
+                'total_monthly_payment': total_payments,
+                'total_interest_payment': total_interest,
+                'total_principal_payment': float(df['Principal_Payment'].sum())
             }
 
-            # Add summary information
-            summary_info = [
-                {'Payment_Number': '', 'Payment_Date': '', 'Beginning_Balance': '', 'Monthly_Payment': '',
-                 'Interest_Payment': '', 'Principal_Payment': '', 'Ending_Balance': '', 'Interest_Rate_Applied': ''},
-                {'Payment_Number': 'LOAN SUMMARY', 'Payment_Date': '', 'Beginning_Balance': '', 'Monthly_Payment': '',
-                 'Interest_Payment': '', 'Principal_Payment': '', 'Ending_Balance': '', 'Interest_Rate_Applied': ''},
-                {'Payment_Number': 'Original Principal', 'Payment_Date': f'K{principal:,.2f}', 'Beginning_Balance': '',
-                 'Monthly_Payment': '', 'Interest_Payment': '', 'Principal_Payment': '', 'Ending_Balance': '',
-                 'Interest_Rate_Applied': ''},
-                {'Payment_Number': 'Total Interest', 'Payment_Date': f'K{df["Interest_Payment"].sum():,.2f}',
-                 'Beginning_Balance': '', 'Monthly_Payment': '', 'Interest_Payment': '', 'Principal_Payment': '',
-                 'Ending_Balance': '', 'Interest_Rate_Applied': ''},
-                {'Payment_Number': 'Total Payments', 'Payment_Date': f'K{df["Monthly_Payment"].sum():,.2f}',
-                 'Beginning_Balance': '', 'Monthly_Payment': '', 'Interest_Payment': '', 'Principal_Payment': '',
-                 'Ending_Balance': '', 'Interest_Rate_Applied': ''},
-                {'Payment_Number': 'Monthly Rate', 'Payment_Date': f'{monthly_rate_percent}%', 'Beginning_Balance': '',
-                 'Monthly_Payment': '', 'Interest_Payment': '', 'Principal_Payment': '', 'Ending_Balance': '',
-                 'Interest_Rate_Applied': ''},
-                {'Payment_Number': 'Effective Rate', 'Payment_Date': f'{effective_rate:.2f}%', 'Beginning_Balance': '',
-                 'Monthly_Payment': '', 'Interest_Payment': '', 'Principal_Payment': '', 'Ending_Balance': '',
-                 'Interest_Rate_Applied': ''},
-                {'Payment_Number': 'Loan Method', 'Payment_Date': method.title(), 'Beginning_Balance': '',
-                 'Monthly_Payment': '', 'Interest_Payment': '', 'Principal_Payment': '', 'Ending_Balance': '',
-                 'Interest_Rate_Applied': ''},
-                {'Payment_Number': 'Loan Duration', 'Payment_Date': f'{int(days)} days ({months} months)',
-                 'Beginning_Balance': '', 'Monthly_Payment': '', 'Interest_Payment': '', 'Principal_Payment': '',
-                 'Ending_Balance': '', 'Interest_Rate_Applied': ''}
-            ]
-
-            # Add totals and summary to DataFrame
-            df = pd.concat([df, pd.DataFrame([totals_row]), pd.DataFrame(summary_info)], ignore_index=True)
-
             # Generate file path if not provided
             if file_path is None:
                 timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -935,11 +927,12 @@ class Loans:
             return {
                 'status': True,
                 'message': 'Payment schedule generated successfully',
-                'schedule_dataframe': df,  # The actual pandas DataFrame
+                'schedule_dataframe': df,  # The actual pandas DataFrame, one typed row per instalment
+                'schedule_summary': summary,
                 'csv_filename': file_path,  # Suggested filename
-                'total_payments': len(schedule_data),
-                'total_interest': round(df.iloc[:-9]['Interest_Payment'].sum(), 2),
-                'total_amount': round(df.iloc[:-9]['Monthly_Payment'].sum(), 2),
+                'total_payments': months,
+                'total_interest': round(total_interest, 2),
+                'total_amount': round(total_payments, 2),
                 'monthly_rate': monthly_rate_percent,
                 'effective_rate': round(effective_rate, 2)
             }
@@ -957,6 +950,36 @@ class Loans:
                 'message': f'An error occurred while generating payment schedule: {str(e)}'
             }
 
+    def schedule_export_dataframe(self, schedule_df, summary):
+        """
+        Returns the payment schedule with the totals row and loan summary rows appended, as
+        written to the schedule CSV and shown on the application summary page.
+
+        Args:
+            schedule_df: The schedule_dataframe returned by generate_payment_schedule_dataframe
+            summary: The schedule_summary returned with it
+
+        Returns:
+            pd.DataFrame: The schedule followed by the totals and summary rows
+        """
+        from portfolio import schedule_export_frame
+        return schedule_export_frame(schedule_df, summary)
+
+    def contract_values(self, borrower_name, borrower_id, organisation_name, loan_summary, days):
+        """returns the contract template placeholders for a loan summary"""
+        return {
+            'borrower_name': borrower_name,
+            'borrower_id': borrower_id,
+            'organisation_name': organisation_name,
+            'principal': loan_summary['principal'],
+            'recoverable_amount': loan_summary['recoverable_amount'],
+            'monthly_interest_rate': loan_summary['monthly_interest_rate'],
+            'loan_tenure_days': loan_summary['loan_tenure_days'],
+            'loan_tenure_months': loan_summary.get('loan_tenure_months', round(int(days) / 30)),
+            'method': loan_summary['method'],
+            'instalments': loan_summary['instalments']
+        }
+
     def generate_loan_contract(self, borrower_name, borrower_id, organisation_name, principal, days, method):
         """Generates a contract for that loan and returns the contract content"""
         try:
@@ -970,10 +993,11 @@ class Loans:
                     'contract_content': None
                 }
 
-            # Read the base template
+            # Fill the compiled template in memory
             try:
-                with open('templates/contract.txt', 'r') as file:
-                    template = file.read()
+                filled_contract = contract_renderer.render(
+                    self.contract_values(borrower_name, borrower_id, organisation_name, loan_summary, days)
+                )
             except FileNotFoundError:
                 return {
                     'status': False,
@@ -981,33 +1005,10 @@ class Loans:
                     'contract_content': None
                 }
 
-            # Replace placeholders
-            filled_contract = template.format(
-                borrower_name=borrower_name,
-                borrower_id=borrower_id,
-                organisation_name=organisation_name,
-                principal=loan_summary['principal'],
-                recoverable_amount=loan_summary['recoverable_amount'],
-                monthly_interest_rate=loan_summary['monthly_interest_rate'],
-                loan_tenure_days=loan_summary['loan_tenure_days'],
-                loan_tenure_months=loan_summary.get('loan_tenure_months', round(int(days) / 30)),
-                method=loan_summary['method'],
-                instalments=loan_summary['instalments']
-            )
-
-            # Optionally save the filled contract to a file (for backup)
-            output_path = 'templates/generated_contract.txt'
-            try:
-                with open(output_path, 'w') as file:
-                    file.write(filled_contract)
-            except Exception as e:
-                print(f"Warning: Could not save contract to file: {e}")
-
             return {
                 'status': True,
                 'message': 'Contract generated successfully',
-                'contract_content': filled_contract,
-                'file_path': output_path
+                'contract_content': filled_contract
             }
 
         except Exception as e:
@@ -1018,6 +1019,49 @@ class Loans:
                 'contract_content': None
             }
 
+    def generate_loan_contracts(self, contracts):
+        """
+        Generates the contracts of several loans in one call.
+
+        Args:
+            contracts: List of dicts with borrower_name, borrower_id, organisation_name, principal, days and method
+
+        Returns:
+            dict: Status and contract_contents, one per entry in the order given (None where the
+            loan summary could not be generated)
+        """
+        try:
+            values_list = []
+            positions = []
+            for position, contract in enumerate(contracts):
+                loan_summary = self.loan_estimate_summary(contract['principal'], contract['days'], contract['method'])
+                if not loan_summary['status']:
+                    print(f"Could not generate loan summary for borrower {contract['borrower_id']}")
+                    continue
+
+                values_list.append(self.contract_values(contract['borrower_name'], contract['borrower_id'],
+                                                        contract['organisation_name'], loan_summary,
+                                                        contract['days']))
+                positions.append(position)
+
+            contract_contents = [None] * len(contracts)
+            for position, filled_contract in zip(positions, contract_renderer.render_batch(values_list)):
+                contract_contents[position] = filled_contract
+
+            return {
+                'status': True,
+                'message': 'Contracts generated successfully',
+                'contract_contents': contract_contents
+            }
+
+        except Exception as e:
+            print(f"Exception in generate_loan_contracts: {e}")
+            return {
+                'status': False,
+                'message': f'Error generating contracts: {str(e)}',
+                'contract_contents': None
+            }
+
     def upload_loan_files(self, contract_content, payment_schedule_df, borrower_name, loan_id=None):
         """
         Uploads the loan contract and payment schedule to the supabase bucket called loan-files
@@ -1124,12 +1168,96 @@ class Loans:
             print(f'Exception: {e}')
             return None
 
+    def build_loan_documents(self, loan_summary, borrower_id):
+        """
+        Builds the payment schedule and contract for a loan request from its summary.
+
+        Returns:
+            dict: Status, borrower_name, payment_schedule_df (with the summary rows), the typed schedule_df and
+            its schedule_summary, and contract_content
+        """
+        try:
+            borrower_response = (
+                self.supabase
+                .table('borrowers')
+                .select('id, first_name, last_name, organisation_id')
+                .eq('id', borrower_id)
+                .execute()
+            )
+            if not borrower_response.data:
+                return {
+                    'status': False,
+                    'message': f'Borrower {borrower_id} not found'
+                }
+
+            borrower = borrower_response.data[0]
+            borrower_name = f"{borrower['first_name']} {borrower['last_name']}"
+
+            organisation_response = (
+                self.supabase
+                .table('organisations')
+                .select('id, name')
+                .eq('id', borrower['organisation_id'])
+                .execute()
+            )
+            organisation_name = organisation_response.data[0]['name'] if organisation_response.data else None
+
+            payment_schedule_result = self.generate_payment_schedule_dataframe(
+                principal=loan_summary['principal'],
+                days=loan_summary['loan_tenure_days'],
+                method=loan_summary['method']
+            )
+            if not payment_schedule_result['status']:
+                return {
+                    'status': False,
+                    'message': 'Failed to generate payment schedule'
+                }
+
+            loan_contract_result = self.generate_loan_contract(
+                borrower_name=borrower_name,
+                borrower_id=borrower['id'],
+                organisation_name=organisation_name,
+                principal=loan_summary['principal'],
+                days=loan_summary['loan_tenure_days'],
+                method=loan_summary['method']
+            )
+            if not loan_contract_result['status']:
+                return {
+                    'status': False,
+                    'message': 'Failed to generate loan contract'
+                }
+
+            return {
+                'status': True,
+                'borrower_name': borrower_name,
+                'payment_schedule_df': self.schedule_export_dataframe(payment_schedule_result['schedule_dataframe'],
+                                                                      payment_schedule_result['schedule_summary']),
+                'schedule_df': payment_schedule_result['schedule_dataframe'],
+                'schedule_summary': payment_schedule_result['schedule_summary'],
+                'contract_content': loan_contract_result['contract_content']
+            }
+
+        except Exception as e:
+            print(f'Exception: {e}')
+            return {
+                'status': False,
+                'message': str(e)
+            }
+
     def upload_and_store_loan_files(self, contract_content, payment_schedule_df, borrower_name, borrower_id,
-                                    loan_id=None):
+                                    loan_id=None, schedule_df=None, schedule_summary=None):
+        """
+        Uploads the contract and payment schedule of a loan and links them in loan_files.
+
+        When the typed schedule and its summary are given, a packed binary copy of the schedule
+        is stored next to the CSV (same name, .schedule extension) for schedule_cache to read
+        without parsing. It is optional, readers fall back to the CSV when it is missing.
+        """
         try:
-            # Debug: List buckets to verify loan-files exists
-            bucket_list = self.supabase.storage.list_buckets()
-            print(f"Available buckets: {[bucket.name for bucket in bucket_list]}")
+            # listing the buckets is a storage round trip, only made when debug output is on
+            if logger.isEnabledFor(logging.DEBUG):
+                bucket_list = self.supabase.storage.list_buckets()
+                logger.debug('available buckets', buckets=[bucket.name for bucket in bucket_list])
 
             # Generate unique filenames with timestamp
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -1184,6 +1312,21 @@ class Loans:
                     'loan_file_id': None
                 }
 
+            # Upload the packed schedule next to the CSV
+            schedule_binary_filename = None
+            if schedule_df is not None and schedule_summary is not None:
+                from schedule_format import pack_schedule, binary_name
+
+                binary_response = self.supabase.storage.from_("loan-files").upload(
+                    path=binary_name(schedule_filename),
+                    file=pack_schedule(schedule_df, schedule_summary),
+                    file_options={"content-type": "application/octet-stream"}
+                )
+                if hasattr(binary_response, 'error') and binary_response.error:
+                    print(f'Failed to upload packed schedule: {binary_response.error.message}')
+                else:
+                    schedule_binary_filename = binary_name(schedule_filename)
+
             # Get public URLs for the uploaded files
             contract_url = self.supabase.storage.from_("loan-files").get_public_url(contract_filename)
             schedule_url = self.supabase.storage.from_("loan-files").get_public_url(schedule_filename)
@@ -1200,7 +1343,10 @@ class Loans:
             if not db_response.data:
                 # Clean up uploaded files if database insert fails
                 try:
-                    self.supabase.storage.from_("loan-files").remove([contract_filename, schedule_filename])
+                    files_to_remove = [contract_filename, schedule_filename]
+                    if schedule_binary_filename:
+                        files_to_remove.append(schedule_binary_filename)
+                    self.supabase.storage.from_("loan-files").remove(files_to_remove)
                 except Exception as e:
                     print(f"Cleanup error: {e}")
                 return {
@@ -1234,6 +1380,8 @@ class Loans:
                         files_to_remove.append(contract_filename)
                     if 'schedule_filename' in locals():
                         files_to_remove.append(schedule_filename)
+                    if locals().get('schedule_binary_filename'):
+                        files_to_remove.append(schedule_binary_filename)
                     if files_to_remove:
                         self.supabase.storage.from_("loan-files").remove(files_to_remove)
                 except Exception as cleanup_error:
@@ -1305,13 +1453,17 @@ class Loans:
         )
         loan_type = loan_request_response.data[0]['method'].lower()  # 'simple' or 'amortization'
 
-        # Base repayment query for this loan
-        repayment_query = (
+        # Fetch every repayment for this loan once, sorted by created_at so each month's
+        # repayments can be found with a binary search instead of a query per month
+        repayment_response = (
             self.supabase
             .table('loan_repayments')
             .select('*')
             .eq('loan_id', loan_id)
+            .execute()
         )
+        repayments = sorted(repayment_response.data or [], key=lambda r: r['created_at'])
+        repayment_dates = [r['created_at'] for r in repayments]
 
         # Create empty DataFrame
         columns = ["No", "Due Date", "Payment Due", "Interest", "Principal", "Balance", "Actual Paid", "Status"]
@@ -1330,14 +1482,10 @@ class Loans:
         for number in range(1, loan['term_months'] + 1):
             next_date = current_date + timedelta(days=30)
 
-            # Get repayments for this month
-            repayments_this_month = (
-                repayment_query
-                .gte('created_at', current_date.strftime("%Y-%m-%d"))
-                .lt('created_at', next_date.strftime("%Y-%m-%d"))
-                .execute()
-            )
-            payments_data = repayments_this_month.data
+            # Get repayments for this month (created_at >= current_date and < next_date)
+            first = bisect_left(repayment_dates, current_date.strftime("%Y-%m-%d"))
+            last = bisect_left(repayment_dates, next_date.strftime("%Y-%m-%d"))
+            payments_data = repayments[first:last]
             amount_paid_this_month = sum(float(r['payment_amount']) for r in payments_data)
 
             # If repayment data exists for this month, use it for interest, principal, and balance
@@ -1380,5 +1528,6 @@ class Loans:
             remaining_balance = balance
 
         # Create DataFrame
+        import pandas as pd
         loan_df = pd.DataFrame(rows, columns=columns)
         return loan_df
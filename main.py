@@ -1,14 +1,14 @@
 from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+import click
 from dotenv import load_dotenv
 from flask_wtf.csrf import CSRFProtect, generate_csrf
 
 
 import os
-from datetime import datetime
-import traceback
+import importlib
+import logging
+import math
 import secrets
-import io
-import pandas as pd
 
 # Load environment variables
 load_dotenv()
@@ -22,10 +22,19 @@ from borrowers import Borrowers
 from notifications import Notifications
 from wallet import Wallet
 from settings import Settings
+from metrics import PortfolioMetrics
+from quotes import QuoteStore
+from jobs import JobQueue, run_worker
+from schedule_cache import load_schedule
+from instrumentation import init_instrumentation
+from structured_logging import get_logger, configure_logging
+
+logger = get_logger(__name__)
 
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY') or 'fallback-secret-key-for-development'
 csrf = CSRFProtect(app)
+init_instrumentation(app)
 
 
 # Make CSRF token available in all templates
@@ -34,6 +43,15 @@ def inject_csrf_token():
     return dict(csrf_token=generate_csrf())
 
 
+def uploaded_files_summary(files):
+    """name, type and size of each uploaded file for the logs, never the contents"""
+    return {
+        key: {'filename': file.filename, 'content_type': file.content_type, 'bytes': file.content_length}
+        if file and file.filename else None
+        for key, file in files.items()
+    }
+
+
 # Add a root route
 @app.route('/')
 def index():
@@ -133,8 +151,9 @@ def home():
     outstanding_principal_balance = home_manager.total_loan_disbursed() - home_manager.total_principal_repaid()
     interest_earned = home_manager.interest_earned()
 
-    expected_interest = home_manager.expected_interest()
-    total_receivables = home_manager.total_receivables()
+    portfolio_totals = home_manager.portfolio_aggregates()
+    expected_interest = portfolio_totals['expected_interest']
+    total_receivables = portfolio_totals['total_receivables']
     total_owed = outstanding_principal_balance + expected_interest
 
 
@@ -176,6 +195,29 @@ def get_interest_data(year):
         return jsonify({'error': 'Internal server error'}), 500
 
 
+@app.route('/get_interest_data')
+def get_all_interest_data():
+    """API endpoint to get interest data for every year at once, so the chart can switch years without refetching"""
+    if 'email' not in session or 'user_type' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        home_manager = Home()
+        interest_by_year = home_manager.interest_per_quarter_all_years()
+
+        if interest_by_year is None:
+            return jsonify({'error': 'Failed to fetch data'}), 500
+
+        return jsonify({
+            'success': True,
+            'data': interest_by_year
+        })
+
+    except Exception as e:
+        print(f"Error fetching interest data: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+
 
 @app.route('/delete_notification/<notification_id>')
 def delete_notification(notification_id):
@@ -232,8 +274,8 @@ def organisation_borrowers(org_id):
 
 
     individuals = loans_manager.active_organisational_borrowers(org_id)
-    funds_collected = loans_manager.organisation_revenue_and_balance(organisational_id=org_id)
-    fund_balance = loans_manager.organisation_revenue_and_balance(organisational_id=org_id)
+    # revenue and balance come from the same query
+    funds_collected = fund_balance = loans_manager.organisation_revenue_and_balance(organisational_id=org_id)
     org_names = organisations_manager.get_organisations()
     organisation_name = organisations_manager.get_organisational_name(org_id)
     loans = loans_manager.organisations_loans(org_id)
@@ -281,21 +323,11 @@ def add_borrower():
 
     if request.method == 'POST':
         try:
-            print("=== POST REQUEST DEBUG INFO ===")
-            print(f"Form data keys: {list(request.form.keys())}")
-            print(f"Files data keys: {list(request.files.keys())}")
-            print(f"Total files from form: {request.form.get('total_files', 'Not set')}")
-
-            # Debug: Print all form data
-            for key, value in request.form.items():
-                print(f"Form field - {key}: {value}")
-
-            # Debug: Print all files
-            for key, file in request.files.items():
-                if file and file.filename:
-                    print(f"File - {key}: {file.filename} ({file.content_type}) - {file.content_length} bytes")
-                else:
-                    print(f"File - {key}: Empty or invalid file")
+            # field names and file metadata only, the form holds personal details
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug('add borrower request', form_fields=list(request.form.keys()),
+                             files=uploaded_files_summary(request.files),
+                             total_files=request.form.get('total_files'))
 
             # Handle the borrower creation with files
             result = borrowers_manager.create_borrower_with_files(
@@ -303,8 +335,6 @@ def add_borrower():
                 request_files=request.files
             )
 
-            print(f"Final result from create_borrower_with_files: {result}")
-
             if result["success"]:
                 response_data = {
                     "success": True,
@@ -314,7 +344,8 @@ def add_borrower():
                     "file_urls": result.get("file_upload_result", {}).get("file_urls", {}),
                     "database_result": result.get("file_upload_result", {}).get("database_result", {})
                 }
-                print(f"Sending success response: {response_data}")
+                logger.info('borrower created', borrower_id=result["borrower_id"],
+                            files_processed=response_data["files_processed"])
                 return jsonify(response_data), 200
             else:
                 error_response = {
@@ -323,14 +354,12 @@ def add_borrower():
                     "error": result.get("error", "Unknown error"),
                     "details": result
                 }
-                print(f"Sending error response: {error_response}")
+                logger.warning('borrower not created', message=result["message"], error=error_response["error"])
                 return jsonify(error_response), 400
 
         except Exception as e:
             error_msg = f"Server error: {str(e)}"
-            print(f"Exception in route: {error_msg}")
-            import traceback
-            print(f"Traceback: {traceback.format_exc()}")
+            logger.exception('add borrower failed')
 
             return jsonify({
                 "success": False,
@@ -386,22 +415,11 @@ def update_borrower():
                 "message": "Cannot update borrower without ID"
             }), 400
 
-        print("=== UPDATE REQUEST DEBUG INFO ===")
-        print(f"Borrower ID: {borrower_id}")
-        print(f"Form data keys: {list(request.form.keys())}")
-        print(f"Files data keys: {list(request.files.keys())}")
-        print(f"Total files from form: {request.form.get('total_files', 'Not set')}")
-
-        # Debug: Print all form data
-        for key, value in request.form.items():
-            print(f"Form field - {key}: {value}")
-
-        # Debug: Print all files
-        for key, file in request.files.items():
-            if file and file.filename:
-                print(f"File - {key}: {file.filename} ({file.content_type}) - {file.content_length} bytes")
-            else:
-                print(f"File - {key}: Empty or invalid file")
+        # field names and file metadata only, the form holds personal details
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('update borrower request', borrower_id=borrower_id, form_fields=list(request.form.keys()),
+                         files=uploaded_files_summary(request.files),
+                         total_files=request.form.get('total_files'))
 
         # Handle the borrower update with files
         # You'll need to create this method in your Borrowers class
@@ -411,8 +429,6 @@ def update_borrower():
             request_files=request.files
         )
 
-        print(f"Final result from update_borrower_with_files: {result}")
-
         if result["success"]:
             response_data = {
                 "success": True,
@@ -422,7 +438,8 @@ def update_borrower():
                 "file_urls": result.get("file_upload_result", {}).get("file_urls", {}),
                 "database_result": result.get("file_upload_result", {}).get("database_result", {})
             }
-            print(f"Sending success response: {response_data}")
+            logger.info('borrower updated', borrower_id=borrower_id,
+                        files_processed=response_data["files_processed"])
             return jsonify(response_data), 200
         else:
             error_response = {
@@ -431,14 +448,13 @@ def update_borrower():
                 "error": result.get("error", "Unknown error"),
                 "details": result
             }
-            print(f"Sending error response: {error_response}")
+            logger.warning('borrower not updated', borrower_id=borrower_id, message=result["message"],
+                           error=error_response["error"])
             return jsonify(error_response), 400
 
     except Exception as e:
         error_msg = f"Server error during update: {str(e)}"
-        print(f"Exception in update route: {error_msg}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception('update borrower failed', borrower_id=borrower_id)
 
         return jsonify({
             "success": False,
@@ -531,7 +547,8 @@ def loan_application_summary():
     # Convert DataFrame to JSON for JavaScript
     schedule_data = None
     if payment_schedule_result['status']:
-        df = payment_schedule_result['schedule_dataframe']
+        df = loan_manager.schedule_export_dataframe(payment_schedule_result['schedule_dataframe'],
+                                                    payment_schedule_result['schedule_summary'])
         # Convert DataFrame to list of dictionaries for easier JavaScript handling
         schedule_data = df.to_dict('records')
 
@@ -549,10 +566,23 @@ def loan_application_summary():
     if loan_contract_result and loan_contract_result['status']:
         loan_contract = loan_contract_result['contract_content']
 
+    # Keep the computed quote so /loan_request can reuse it instead of recomputing
+    quote_token = None
+    if estimate_summary.get('status') and payment_schedule_result['status'] and loan_contract:
+        quote_token = QuoteStore(app.secret_key).save({
+            'loan_summary': estimate_summary,
+            'schedule': payment_schedule_result['schedule_dataframe'].to_dict('list'),
+            'schedule_summary': payment_schedule_result['schedule_summary'],
+            'contract_content': loan_contract,
+            'borrower_name': f"{verified['data'][0]['first_name']} {verified['data'][0]['last_name']}",
+            'monthly_rate': loan_manager.loan_packages()
+        }, borrower_id=verified['data'][0]['id'])
+
     return render_template('view_application_summary.html',
                            summary=estimate_summary,
                            schedule_data=schedule_data,
                            loan_contract=loan_contract,
+                           quote_token=quote_token,
                            borrower_info={
                                'name': f"{verified['data'][0]['first_name']} {verified['data'][0]['last_name']}",
                                'id': verified['data'][0]['id'],
@@ -566,6 +596,67 @@ def loan_application_summary():
                            )
 
 
+@app.route('/loan_quotes', methods=['POST'])
+def loan_quotes():
+    """API endpoint to price many (principal, days, method) scenarios in one call"""
+    if 'email' not in session or 'user_type' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    payload = request.get_json(silent=True) or {}
+    scenarios = payload.get('scenarios')
+
+    if not isinstance(scenarios, list):
+        return jsonify({'error': 'Expected a JSON body with a list of scenarios'}), 400
+
+    loan_manager = Loans()
+    result = loan_manager.loan_quotes(scenarios)
+
+    if not result['status']:
+        return jsonify({'error': result['message']}), 400
+
+    return jsonify({
+        'success': True,
+        'monthly_rate': result['monthly_rate'],
+        'data': result['quotes']
+    })
+
+
+def prepare_loan_request(borrower_manager, data, borrower_id):
+    """
+    Rebuilds the loan summary of a loan request from its form data, used when no valid quote
+    from the summary page is available.
+
+    Returns:
+        dict: The loan summary, or None after flashing the reason it failed
+    """
+    # Reconstruct loan_summary from form data
+    try:
+        loan_summary = {
+            'principal': float(data.get('principal', 0)),
+            'recoverable_amount': float(data.get('recoverable_amount', 0)),
+            'monthly_interest_rate': float(data.get('monthly_rate', 0)),
+            'effective_amount': float(data.get('effective_amount', 0)),
+            'effective_rate': float(data.get('effective_rate', 0)),
+            'loan_tenure_days': int(data.get('days', 0)),
+            'loan_tenure_months': int(data.get('loan_tenure_months', 0)),
+            'method': data.get('method', ''),
+            'instalments': float(data.get('instalments', 0))
+        }
+    except ValueError as ve:
+        flash(f'Invalid form data: {str(ve)}', 'error')
+        return None
+
+    logger.debug('loan summary rebuilt from the form', borrower_id=borrower_id, loan_summary=loan_summary)
+
+    # Make sure the borrower exists before the request is created
+    borrower_name = borrower_manager.get_borrower_name(borrower_id)
+    if not borrower_name:
+        flash('Borrower not found', 'error')
+        return None
+
+    return loan_summary
+
+
 @app.route('/loan_request', methods=['POST'])
 def create_loan_request():
 
@@ -577,16 +668,14 @@ def create_loan_request():
 
         loans_manager = Loans()
         borrower_manager = Borrowers()
-        organisation_manager = Organisations()
 
         # Get form data
         data = request.form.to_dict()
         borrower_id = data.get('borrower_id')
 
-        print(f"=== LOAN REQUEST DEBUG ===")
-        print(f"Session data: {dict(session)}")
-        print(f"Form data: {data}")
-        print(f"Borrower ID: {borrower_id}")
+        # never the whole session, it holds the csrf token
+        logger.debug('loan request received', borrower_id=borrower_id, user_id=session.get('user_id'),
+                     user_type=session.get('user_type'), form_fields=list(data))
 
         # Validate borrower_id
         if not borrower_id:
@@ -605,140 +694,70 @@ def create_loan_request():
                         return redirect(url_for('login'))
                     user_id = user_response.data[0]['id']
                     session['user_id'] = user_id
-                    print(f"Retrieved user_id from database: {user_id}")
-                except Exception as e:
-                    print(f"Error retrieving user_id: {e}")
+                    logger.debug('user_id looked up by email', user_id=user_id)
+                except Exception:
+                    logger.exception('user_id lookup failed')
                     flash('Error retrieving user information', 'error')
                     return redirect(url_for('login'))
             else:
                 flash('User not authenticated', 'error')
                 return redirect(url_for('login'))
 
-        print(f"Using user_id: {user_id}")
+        # Reuse the quote computed on the summary page when it is still valid
+        quote_store = QuoteStore(app.secret_key)
+        quote = quote_store.load(data.get('quote_token'), borrower_id)
+        if quote and not loans_manager.quote_is_current(quote, data):
+            logger.info('stale quote, using the form data', borrower_id=borrower_id)
+            quote = None
 
-        # Reconstruct loan_summary from form data
-        try:
-            loan_summary = {
-                'principal': float(data.get('principal', 0)),
-                'recoverable_amount': float(data.get('recoverable_amount', 0)),
-                'monthly_interest_rate': float(data.get('monthly_rate', 0)),
-                'effective_amount': float(data.get('effective_amount', 0)),
-                'effective_rate': float(data.get('effective_rate', 0)),
-                'loan_tenure_days': int(data.get('days', 0)),
-                'loan_tenure_months': int(data.get('loan_tenure_months', 0)),
-                'method': data.get('method', ''),
-                'instalments': float(data.get('instalments', 0))
-            }
-        except ValueError as ve:
-            flash(f'Invalid form data: {str(ve)}', 'error')
-            return redirect(url_for('loan_application'))
-
-        print(f"Loan summary: {loan_summary}")
-
-        # Get borrower information
-        borrower_name = borrower_manager.get_borrower_name(borrower_id)
-        if not borrower_name:
-            flash('Borrower not found', 'error')
-            return redirect(url_for('loan_application'))  # Immediate redirect
-
-        # Get borrower details for contract generation
-        try:
-            borrower_response = loans_manager.supabase.table('borrowers').select('*').eq('id', borrower_id).execute()
-            if not hasattr(borrower_response, 'data') or not borrower_response.data:
-                print(f"Error: Supabase response missing 'data' or no data for borrower_id {borrower_id}: {borrower_response}")
-                flash('Borrower details not found', 'error')
+        if quote:
+            loan_summary = quote['loan_summary']
+        else:
+            loan_summary = prepare_loan_request(borrower_manager, data, borrower_id)
+            if loan_summary is None:
                 return redirect(url_for('loan_application'))
-        except Exception as e:
-            print(f"Error fetching borrower details: {e}")
-            flash(f'Error fetching borrower details: {str(e)}', 'error')
-            return redirect(url_for('loan_application'))
-
-        borrower = borrower_response.data[0]
-
-        # Generate payment schedule
-        payment_schedule_result = loans_manager.generate_payment_schedule_dataframe(
-            principal=loan_summary['principal'],
-            days=loan_summary['loan_tenure_days'],
-            method=loan_summary['method']
-        )
-
-        if not payment_schedule_result['status']:
-            flash('Failed to generate payment schedule', 'error')
-            return redirect(url_for('loan_application'))
-
-        # Generate loan contract
-        loan_contract_result = loans_manager.generate_loan_contract(
-            borrower_name=f"{borrower['first_name']} {borrower['last_name']}",
-            borrower_id=borrower['id'],
-            organisation_name=organisation_manager.get_organisational_name(borrower['organisation_id']),
-            principal=loan_summary['principal'],
-            days=loan_summary['loan_tenure_days'],
-            method=loan_summary['method']
-        )
-
-        if not loan_contract_result['status']:
-            flash('Failed to generate loan contract', 'error')
-            return redirect(url_for('loan_application'))
-
-        print("Uploading files to storage...")
 
-        # Upload the files to the files table
-        files_result = loans_manager.upload_and_store_loan_files(
-            contract_content=loan_contract_result['contract_content'],
-            payment_schedule_df=payment_schedule_result['schedule_dataframe'],
-            borrower_name=borrower_name,
-            borrower_id=borrower_id
-        )
-
-        if not files_result['status']:
-            flash(f'Failed to upload files: {files_result["message"]}', 'error')
-            return redirect(url_for('loan_application'))
-
-        print(f"Files uploaded successfully: {files_result}")
-
-        # Get the loan_file_id from the files_result
-        loan_file_id = files_result['loan_file_id']
-
-        print(f"Creating loan request with loan_file_id: {loan_file_id}")
-
-        # Now create the loan request
+        # Create the loan request now, its files are linked once the job has uploaded them
         loan_request_data = loans_manager.upload_loan_request(
             loan_summary=loan_summary,
             user_id=user_id,
             borrower_id=borrower_id,
-            loan_file_id=loan_file_id
+            loan_file_id=None
         )
 
         if not loan_request_data:
             flash('Failed to create loan request', 'error')
             return redirect(url_for('loan_application'))
 
-        print(f"Loan request created: {loan_request_data}")
-
-        # Store effective rate information
-        loan_request_id = loan_request_data[0]['id']
-        effective_rate_result = loans_manager.store_effective_rate(
-            loan_id=loan_request_id,
-            principal=loan_summary['principal'],
-            days=loan_summary['loan_tenure_days'],
-            method=loan_summary['method']
-        )
+        # Documents, effective rate and notification are produced by the job worker
+        try:
+            job_id = JobQueue().enqueue('loan_request_documents', {
+                'loan_request_id': loan_request_data[0]['id'],
+                'loan_request': loan_request_data[0],
+                'loan_summary': loan_summary,
+                'borrower_id': borrower_id,
+                'quote': quote
+            })
+        except Exception:
+            # without its job the request would never get a contract, so it is not kept
+            logger.exception('loan request job not queued, removing the request',
+                             loan_request_id=loan_request_data[0]['id'])
+            loans_manager.supabase.table('loan_requests').delete().eq('id', loan_request_data[0]['id']).execute()
+            flash('Failed to create loan request', 'error')
+            return redirect(url_for('loan_application'))
 
-        if not effective_rate_result['status']:
-            print(f"Warning: Failed to store effective rate: {effective_rate_result.get('message')}")
+        if quote:
+            quote_store.discard(quote['quote_id'])
 
-        # store it as a notification in the notifications table
-        notification_manager = Notifications()
-        notification_response = notification_manager.formulate_notification(loan_request_data[0]) # formulate the notification
-        notification_manager.store_notification(notification_response)
+        logger.info('loan request created', loan_request_id=loan_request_data[0]['id'], borrower_id=borrower_id,
+                    user_id=user_id, job_id=job_id, from_quote=bool(quote))
 
         # Success - redirect to success page or loan details
         flash('Loan request created successfully!', 'success')
-        return redirect(url_for('loan_success'))
+        return redirect(url_for('loan_success', job_id=job_id))
 
     except Exception as e:
-        print(f"Exception in create_loan_request: {e}")
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception('loan request failed')
         flash(f'An error occurred: {str(e)}', 'error')
         return redirect(url_for('loan_application'))
 
@@ -757,6 +776,22 @@ def loan_success():
                           )
 
 
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """API endpoint to follow a background job, e.g. the documents of a new loan request"""
+    if 'email' not in session or 'user_type' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    job = JobQueue().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    return jsonify({
+        'success': True,
+        'data': job
+    })
+
+
 @app.route('/loan_approvals')
 @app.route('/loan_approvals/<status>')
 def loan_approvals(status='pending'):
@@ -783,11 +818,8 @@ def loan_request_information(loan_id, status):
 
     notifications_manager = Notifications()
 
-    # Get loans with the specific status
-    all_loans = notifications_manager.exhausted_loan_request_data(status)
-
-    # Find the specific loan by ID
-    loan_data = next((loan for loan in all_loans if loan['loan_information']['id'] == loan_id), None)
+    # Get the specific loan with this status
+    loan_data = notifications_manager.exhausted_loan_request_by_id(loan_id, status)
 
     if not loan_data:
         return render_template('loan_request_information.html', loan=None, error="Loan not found")
@@ -798,19 +830,20 @@ def loan_request_information(loan_id, status):
 
     try:
         if loan_data.get('loan_files', {}).get('payment_schedule'):
-            df = pd.read_csv(loan_data['loan_files']['payment_schedule'])
-            df = df.fillna('')
+            # Parsed once per file, later views are served from the schedule cache
+            schedule = load_schedule(loan_data['loan_files']['payment_schedule'])
 
-            # Convert the DataFrame to a list of dictionaries, preserving all original data exactly as is
-            schedule_data = df.to_dict(orient='records')
+            # Rows as a list of dictionaries, preserving all original data exactly as is
+            schedule_data = schedule['rows']
 
             # Get the original column names exactly as they are in CSV
-            headers_info = df.columns.tolist()
+            headers_info = schedule['headers']
 
     except FileNotFoundError:
         print(f"Payment schedule file not found for loan {loan_id}")
-    except pd.errors.EmptyDataError:
-        print(f"Payment schedule file is empty for loan {loan_id}")
+    except ValueError as e:
+        # pandas' EmptyDataError and unreadable schedules, pandas itself is not imported here
+        print(f"Payment schedule file is empty or unreadable for loan {loan_id}: {e}")
     except Exception as e:
         print(f"Failed to load payment schedule for loan {loan_id}: {e}")
         import traceback
@@ -871,14 +904,9 @@ def approve_loan(loan_id):
         return redirect(url_for('loan_request_information'))
 
     try:
-        print(f"Attempting to approve loan ID: {loan_id}")  # Debug log
-        print(f"Request method: {request.method}")  # Debug log
-
         notification_manager = Notifications()
         result = notification_manager.approve_loan(loan_id)
 
-        print(f"Rejection result: {result}")  # Debug log
-
         if result:
             #return jsonify({'success': True, 'message': 'Loan approved successfully'})
             return redirect(url_for('approval_success'))
@@ -886,7 +914,7 @@ def approve_loan(loan_id):
         else:
             return jsonify({'success': False, 'message': 'Failed to approve loan'})
     except Exception as e:
-        print(f'Exception in reject_loan route: {e}')  # Debug log
+        logger.exception('approve loan failed', loan_request_id=loan_id)
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
@@ -994,11 +1022,16 @@ def account_info_settings():
 
     if request.method == 'POST':
         # Get the new values from the form
-        nominal_rate_input = request.form.get('nominal_monthly_rate', '0')
+        nominal_rate_input = request.form.get('nominal_monthly_rate', '')
         try:
             nominal_rate_decimal = float(nominal_rate_input) / 100
         except (ValueError, TypeError):
-            nominal_rate_decimal = 0.0
+            nominal_rate_decimal = None
+
+        # every new quote is priced at this rate, a typo must not save a rate of zero
+        if nominal_rate_decimal is None or not math.isfinite(nominal_rate_decimal) or nominal_rate_decimal < 0:
+            flash('Please enter a valid nominal monthly rate')
+            return redirect(url_for('account_info_settings'))
 
         updated_data = {
             'name': request.form.get('institution_name'),
@@ -1010,8 +1043,10 @@ def account_info_settings():
             'telephone': request.form.get('telephone_number')
         }
 
-        # Update the business information in your database
+        # Update the business information in your database, then the rate pricing reads
         result = settings_manager.update_business_info(updated_data)
+        if result:
+            result = settings_manager.update_nominal_rate(nominal_rate_decimal)
         if not result:
             flash('Failed to update, please try again')
         else:  # Add this else
@@ -1022,6 +1057,11 @@ def account_info_settings():
 
     # GET request - show the form with current data
     business_info = settings_manager.get_business_info()
+    if business_info:
+        # show the rate loans are actually priced at, it may have been edited outside the app
+        nominal_rate = Loans().loan_packages()
+        if nominal_rate is not None:
+            business_info[0]['nominal_rate'] = nominal_rate
     return render_template('account_info_settings.html', business_information=business_info)
 
 
@@ -1161,6 +1201,36 @@ def add_partner():
 
 
 
+@app.cli.command('run-jobs')
+def run_jobs():
+    """Runs the background job worker (loan request documents, effective rates, notifications)."""
+    run_worker()
+
+
+@app.cli.command('failed-jobs')
+@click.option('--retry', 'retry_ids', multiple=True, help='Job id to put back in the queue, repeatable.')
+def failed_jobs(retry_ids):
+    """Lists the background jobs that ran out of attempts, or queues them again with --retry."""
+    queue = JobQueue()
+
+    for job_id in retry_ids:
+        queue.retry(job_id)
+        print(f'Job {job_id} queued again')
+    if retry_ids:
+        return
+
+    for job in queue.failed():
+        print(f"{job['id']}  {job['kind']}  loan request {job['payload'].get('loan_request_id')}  "
+              f"{job['attempts']} attempts, last {job['updated_at']}: {job['error']}")
+
+
+@app.cli.command('rebuild-metrics')
+def rebuild_metrics():
+    """Recomputes the portfolio metrics snapshot and the quarterly interest rollups from the loans and loan_repayments tables."""
+    snapshot = PortfolioMetrics().rebuild()
+    print(f'Portfolio metrics rebuilt: {snapshot}')
+
+
 @app.route('/logout')
 def logout():
     session.clear()
@@ -1168,5 +1238,27 @@ def logout():
     return redirect(url_for('login'))
 
 
+# imported by the routes on first use, create_app(preload=True) imports them up front
+PRELOAD_MODULES = ('supabase', 'httpx', 'numpy', 'pandas', 'portfolio', 'schedule_format', 'schedule_cache')
+
+
+def create_app(preload=False):
+    """
+    Returns the app for a WSGI server.
+
+    Importing main stays cheap (no pandas, numpy or supabase sdk), so workers that only serve
+    auth, settings and notification routes never load them. With preload=True they are
+    imported now: under gunicorn's preload_app this runs once in the master and the forked
+    workers share those pages instead of each importing them on first use.
+    """
+    if preload:
+        for module in PRELOAD_MODULES:
+            importlib.import_module(module)
+
+    return app
+
+
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # the dev server shows debug records unless LOG_LEVEL says otherwise
+    configure_logging(level=os.getenv('LOG_LEVEL', 'DEBUG'))
+    create_app().run(debug=True)
\ No newline at end of file
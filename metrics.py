@@ -0,0 +1,212 @@
+from typing import TYPE_CHECKING
+from datetime import datetime, timezone
+
+from database import get_supabase_client, fetch_all_rows
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+
+# the snapshot is a single row in the portfolio_metrics table
+SNAPSHOT_ID = 1
+
+# attempts at a version checked write before giving up
+MAX_UPDATE_ATTEMPTS = 5
+
+QUARTER_NAMES = ("first quarter", "second quarter", "third quarter", "fourth quarter")
+
+
+class PortfolioMetrics:
+    """
+    reads the running portfolio totals shown on the home dashboard, kept current by the
+    triggers on loans and loan_repayments in sql/portfolio_metrics.sql
+    """
+
+    def __init__(self):
+        # shared client for this worker process
+        self.supabase: Client = get_supabase_client()
+
+    def snapshot(self):
+        """returns the current totals, rebuilding them from scratch if no snapshot exists yet"""
+        row = self.load_snapshot()
+        if row is None:
+            row = self.rebuild()
+        return row
+
+    def load_snapshot(self):
+        """returns the snapshot row or None"""
+        response = (
+            self.supabase
+            .table('portfolio_metrics')
+            .select('*')
+            .eq('id', SNAPSHOT_ID)
+            .execute()
+        )
+        return response.data[0] if response.data else None
+
+    def rebuild(self):
+        """
+        Recomputes every total (and the interest rollups) from the loans and loan_repayments tables.
+
+        The triggers of sql/portfolio_metrics.sql bump the version with every increment, so the
+        totals are only written if no loan or repayment changed while the tables were read;
+        otherwise they are read again rather than overwriting the trigger's increment.
+        """
+        InterestRollups().rebuild()
+
+        try:
+            for _ in range(MAX_UPDATE_ATTEMPTS):
+                # the version is read before the tables, any increment made meanwhile changes it
+                row = self.load_snapshot()
+
+                loans = fetch_all_rows(self.supabase, 'loans', 'id, loan_amount')
+                repayments = fetch_all_rows(self.supabase, 'loan_repayments',
+                                            'id, principal_component, interest_component')
+
+                totals = {
+                    'total_loan_amount': sum(float(loan.get('loan_amount') or 0) for loan in loans),
+                    'loan_count': len(loans),
+                    'total_principal_repaid': sum(float(r.get('principal_component') or 0) for r in repayments),
+                    'total_interest_repaid': sum(float(r.get('interest_component') or 0) for r in repayments),
+                    'repayment_count': len(repayments),
+                    'updated_at': datetime.now(timezone.utc).isoformat()
+                }
+
+                if row is None:
+                    totals.update({'id': SNAPSHOT_ID, 'version': 1})
+                    try:
+                        response = self.supabase.table('portfolio_metrics').insert(totals).execute()
+                    except Exception as e:
+                        # another worker created the row first, retry against its version
+                        print(f'[PortfolioMetrics] Insert raced: {e}')
+                        continue
+                else:
+                    totals['version'] = row['version'] + 1
+                    response = (
+                        self.supabase
+                        .table('portfolio_metrics')
+                        .update(totals)
+                        .eq('id', SNAPSHOT_ID)
+                        .eq('version', row['version'])
+                        .execute()
+                    )
+
+                if response.data:
+                    return response.data[0]
+
+            print(f'[PortfolioMetrics] Gave up rebuilding after {MAX_UPDATE_ATTEMPTS} attempts')
+            return self.load_snapshot()
+
+        except Exception as e:
+            print(f'[PortfolioMetrics] Exception while rebuilding: {e}')
+            return None
+
+
+def quarter_of(created_at):
+    """returns the (year, quarter) of an ISO timestamp string"""
+    return int(created_at[:4]), (int(created_at[5:7]) - 1) // 3 + 1
+
+
+def empty_quarters():
+    """returns a quarter name -> interest dict with every quarter at zero"""
+    return {name: 0 for name in QUARTER_NAMES}
+
+
+class InterestRollups:
+    """
+    reads the interest earned per (year, quarter) for the home dashboard chart, kept current by
+    the trigger on loan_repayments in sql/portfolio_metrics.sql
+    """
+
+    def __init__(self):
+        # shared client for this worker process
+        self.supabase: Client = get_supabase_client()
+
+    def quarterly_interest(self, year):
+        """returns the interest earned in each quarter of the year"""
+        response = (
+            self.supabase
+            .table('interest_rollups')
+            .select('quarter, interest_total')
+            .eq('year', year)
+            .execute()
+        )
+
+        quarters = empty_quarters()
+        for row in response.data or []:
+            quarters[QUARTER_NAMES[row['quarter'] - 1]] = float(row['interest_total'])
+
+        return quarters
+
+    def interest_by_year(self):
+        """returns the quarterly interest of every year that has repayments, keyed by year"""
+        rows = fetch_all_rows(self.supabase, 'interest_rollups', 'year, quarter, interest_total', order='year')
+
+        years = {}
+        for row in rows:
+            quarters = years.setdefault(row['year'], empty_quarters())
+            quarters[QUARTER_NAMES[row['quarter'] - 1]] = float(row['interest_total'])
+
+        return years
+
+    def rebuild(self):
+        """
+        Recomputes every rollup from the created_at and interest_component of loan_repayments.
+        Each quarter is written with a check on the version read before the repayments, quarters
+        the trigger changed meanwhile are recomputed on the next attempt.
+        """
+        stale = None
+        for _ in range(MAX_UPDATE_ATTEMPTS):
+            existing = {
+                (row['year'], row['quarter']): row
+                for row in fetch_all_rows(self.supabase, 'interest_rollups', 'year, quarter, version', order='year')
+            }
+            repayments = fetch_all_rows(self.supabase, 'loan_repayments', 'id, interest_component, created_at')
+
+            totals = {}
+            for repayment in repayments:
+                if repayment.get('created_at'):
+                    key = quarter_of(repayment['created_at'])
+                    totals[key] = totals.get(key, 0) + float(repayment.get('interest_component') or 0)
+
+            # quarters that no longer have repayments are zeroed rather than left stale
+            for key in existing.keys() - totals.keys():
+                totals[key] = 0
+
+            if stale is not None:
+                totals = {key: total for key, total in totals.items() if key in stale}
+
+            stale = set()
+            for (year, quarter), interest_total in totals.items():
+                if (year, quarter) in existing:
+                    version = existing[(year, quarter)]['version']
+                    response = (
+                        self.supabase
+                        .table('interest_rollups')
+                        .update({'interest_total': interest_total, 'version': version + 1})
+                        .eq('year', year)
+                        .eq('quarter', quarter)
+                        .eq('version', version)
+                        .execute()
+                    )
+                    if not response.data:
+                        stale.add((year, quarter))
+                else:
+                    try:
+                        self.supabase.table('interest_rollups').insert({
+                            'year': year,
+                            'quarter': quarter,
+                            'interest_total': interest_total,
+                            'version': 1
+                        }).execute()
+                    except Exception as e:
+                        # the trigger created the quarter first, retry against its version
+                        print(f'[InterestRollups] Insert raced for {year} Q{quarter}: {e}')
+                        stale.add((year, quarter))
+
+            if not stale:
+                break
+        else:
+            print(f'[InterestRollups] Gave up rebuilding {sorted(stale)} after {MAX_UPDATE_ATTEMPTS} attempts')
+
+        return self.interest_by_year()
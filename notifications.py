@@ -1,31 +1,21 @@
-import textwrap
-from http.client import responses
-import uuid
-from datetime import datetime
-import mimetypes
-
-import bcrypt
-from supabase import create_client, Client
-from flask import session
+from typing import TYPE_CHECKING
+from database import get_supabase_client, fetch_rows_in
 import os
-import random
-import string
-import smtplib
-from email.message import EmailMessage
-import pandas as pd
+
+from structured_logging import get_logger
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+logger = get_logger(__name__)
 
 
 class Notifications:
     """contains methods required for the home template"""
 
     def __init__(self):
-        url = os.getenv("SUPABASE_URL")
-        service_role_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-
-        if not url or not service_role_key:
-            raise ValueError("SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY is not set.")
-
-        self.supabase: Client = create_client(url, service_role_key)
+        # shared client for this worker process
+        self.supabase: Client = get_supabase_client()
 
         # email authentication
         self.sender_email = os.getenv('SENDER_EMAIL')
@@ -163,93 +153,109 @@ class Notifications:
         - loan_files (from loan_files table)
         - borrower_files (from borrower_files table)
         - organisation_information (from organisations table)
+
+        Each related table is queried once for the whole status page. Pending requests are only
+        listed once the job worker has linked their contract and schedule.
         """
         try:
-            loan_response = (
+            query = (
                 self.supabase
                 .table('loan_requests')
                 .select('*')
                 .eq('status', status)
-                .execute()
             )
 
-            loan_requests = loan_response.data
-            full_data = []
+            if status == 'pending':
+                query = query.not_.is_('loan_file_id', 'null')
 
-            for loan in loan_requests:
-                borrower_id = loan.get('borrower_id')
-                loan_file_id = loan.get('loan_file_id')
+            loan_response = query.execute()
 
-                # Get borrower info
-                borrower_info = (
-                    self.supabase
-                    .table('borrowers')
-                    .select('*')
-                    .eq('id', borrower_id)
-                    .single()
-                    .execute()
-                ).data if borrower_id else {}
-
-                # Get next of kin info
-                next_of_kin_info = {}
-                if borrower_info and borrower_info.get('next_of_kin_id'):
-                    next_of_kin_id = borrower_info['next_of_kin_id']
-                    next_of_kin_info = (
-                        self.supabase
-                        .table('next_of_kins')
-                        .select('first_name, last_name, email, phone')
-                        .eq('id', next_of_kin_id)
-                        .single()
-                        .execute()
-                    ).data
-
-                # Get organisation info
-                organisation_info = {}
-                if borrower_info and borrower_info.get('organisation_id'):
-                    organisation_id = borrower_info['organisation_id']
-                    organisation_info = (
-                        self.supabase
-                        .table('organisations')
-                        .select('*')
-                        .eq('id', organisation_id)
-                        .single()
-                        .execute()
-                    ).data
-
-                # Get loan files info
-                loan_files = (
-                    self.supabase
-                    .table('loan_files')
-                    .select('*')
-                    .eq('id', loan_file_id)
-                    .single()
-                    .execute()
-                ).data if loan_file_id else {}
+            return self.join_loan_request_data(loan_response.data or [])
 
-                # Get borrower files
-                borrower_files = (
-                    self.supabase
-                    .table('borrower_files')
-                    .select('*')
-                    .eq('borrower_id', borrower_id)
-                    .execute()
-                ).data if borrower_id else []
+        except Exception as e:
+            print(f'Exception:: {e}')
+            return []
+
+    def exhausted_loan_request_by_id(self, loan_request_id, status=None):
+        """Gets the full loan request data for a single loan request, or None if it does not exist"""
+        try:
+            query = (
+                self.supabase
+                .table('loan_requests')
+                .select('*')
+                .eq('id', loan_request_id)
+            )
 
-                # Append all data
-                full_data.append({
-                    'personal_information': borrower_info,
-                    'loan_information': loan,
-                    'next_of_kin_information': next_of_kin_info,
-                    'organisation_information': organisation_info,
-                    'loan_files': loan_files,
-                    'borrower_files': borrower_files
-                })
+            if status:
+                query = query.eq('status', status)
+            if status == 'pending':
+                query = query.not_.is_('loan_file_id', 'null')
 
-            return full_data
+            loan_response = query.execute()
+
+            if not loan_response.data:
+                return None
+
+            return self.join_loan_request_data(loan_response.data)[0]
 
         except Exception as e:
             print(f'Exception:: {e}')
-            return []
+            return None
+
+    def join_loan_request_data(self, loan_requests):
+        """Fetches the related data for a list of loan requests in bulk and joins it in memory"""
+        borrower_ids = {loan.get('borrower_id') for loan in loan_requests}
+        loan_file_ids = {loan.get('loan_file_id') for loan in loan_requests}
+
+        # Get borrower info
+        borrowers = {
+            borrower['id']: borrower
+            for borrower in fetch_rows_in(self.supabase, 'borrowers', '*', 'id', borrower_ids)
+        }
+
+        # Get next of kin info
+        next_of_kin_ids = {borrower.get('next_of_kin_id') for borrower in borrowers.values()}
+        next_of_kins = {
+            kin.pop('id'): kin
+            for kin in fetch_rows_in(
+                self.supabase, 'next_of_kins', 'id, first_name, last_name, email, phone', 'id', next_of_kin_ids
+            )
+        }
+
+        # Get organisation info
+        organisation_ids = {borrower.get('organisation_id') for borrower in borrowers.values()}
+        organisations = {
+            organisation['id']: organisation
+            for organisation in fetch_rows_in(self.supabase, 'organisations', '*', 'id', organisation_ids)
+        }
+
+        # Get loan files info
+        loan_files = {
+            loan_file['id']: loan_file
+            for loan_file in fetch_rows_in(self.supabase, 'loan_files', '*', 'id', loan_file_ids)
+        }
+
+        # Get borrower files
+        borrower_files = {}
+        for borrower_file in fetch_rows_in(self.supabase, 'borrower_files', '*', 'borrower_id', borrower_ids):
+            borrower_files.setdefault(borrower_file['borrower_id'], []).append(borrower_file)
+
+        full_data = []
+
+        for loan in loan_requests:
+            borrower_info = borrowers.get(loan.get('borrower_id'), {})
+
+            # Append all data
+            full_data.append({
+                'personal_information': borrower_info,
+                'loan_information': loan,
+                'next_of_kin_information': next_of_kins.get(borrower_info.get('next_of_kin_id'), {}),
+                'organisation_information': organisations.get(borrower_info.get('organisation_id'), {}),
+                'loan_files': loan_files.get(loan.get('loan_file_id'), {}),
+                'borrower_files': borrower_files.get(loan.get('borrower_id'), [])
+            })
+
+        return full_data
 
     def reject_loan_request(self, loan_request_id):
         """Updates the status of a specific loan request to 'rejected'."""
@@ -269,20 +275,17 @@ class Notifications:
     def approve_loan(self, loan_request_id):
         """Approves a loan: updates its status to 'accepted' and inserts it into the loans table."""
         try:
-            print(f"[DEBUG] Approving loan with ID: {loan_request_id}")
-
-            # 1. Update loan request status to 'accepted'
+            # 1. Update loan request status to 'accepted', only once its contract exists
             loan_request_response = (
                 self.supabase
                 .table('loan_requests')
                 .update({'status': 'accepted'})
                 .eq('id', loan_request_id)
+                .not_.is_('loan_file_id', 'null')
                 .execute()
             )
-            print(f"[DEBUG] Loan request update response: {loan_request_response.data}")
-
             if not loan_request_response.data:
-                print("[ERROR] Loan request not found or failed to update.")
+                logger.warning('loan request not found or not updated', loan_request_id=loan_request_id)
                 return None
 
             loan_request = loan_request_response.data[0]
@@ -295,10 +298,9 @@ class Notifications:
                 .eq('id', loan_request['borrower_id'])  # assuming 'id' is correct
                 .execute()
             )
-            print(f"[DEBUG] Borrower response: {borrower_response.data}")
-
             if not borrower_response.data:
-                print("[ERROR] Borrower not found.")
+                logger.warning('borrower of loan request not found', loan_request_id=loan_request_id,
+                               borrower_id=loan_request['borrower_id'])
                 return None
 
             organisation_id = borrower_response.data[0]['organisation_id']
@@ -323,20 +325,20 @@ class Notifications:
                 'loan_request_id': loan_request['id']
             }
 
-            print(f"[DEBUG] Prepared loan_data to insert: {loan_data}")
-
             # 4. Insert into loans table
             loans_response = self.supabase.table('loans').insert(loan_data).execute()
-            print(f"[DEBUG] Loans insert response: {loans_response.data}")
 
             if loans_response.data:
-                print("[SUCCESS] Loan inserted successfully.")
+                logger.info('loan approved', loan_request_id=loan_request_id, loan_id=loans_response.data[0].get('id'),
+                            borrower_id=loan_data['borrower_id'], loan_amount=loan_data['loan_amount'])
+                logger.debug('loan inserted', loan=loans_response.data[0])
+
                 return loans_response.data
             else:
-                print("[ERROR] Loan insert returned no data.")
+                logger.error('loan insert returned no data', loan_request_id=loan_request_id)
 
-        except Exception as e:
-            print(f'[EXCEPTION] {e}')
+        except Exception:
+            logger.exception('approve loan failed', loan_request_id=loan_request_id)
             return None
 
     def get_loan_files_by_loan_request_id(self, loan_request_id):
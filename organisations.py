@@ -1,26 +1,16 @@
-import textwrap
-from http.client import responses
-
-import bcrypt
-from supabase import create_client, Client
-from flask import session
+from typing import TYPE_CHECKING
+from database import get_supabase_client
 import os
-import random
-import string
-import smtplib
-from email.message import EmailMessage
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 
 class Organisations:
     """contains methods required for the home template"""
     def __init__(self):
-        url = os.getenv("SUPABASE_URL")
-        service_role_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-
-        if not url or not service_role_key:
-            raise ValueError("SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY is not set.")
-
-        self.supabase: Client = create_client(url, service_role_key)
+        # shared client for this worker process
+        self.supabase: Client = get_supabase_client()
 
         # email authentication
         self.sender_email = os.getenv('SENDER_EMAIL')
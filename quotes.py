@@ -0,0 +1,108 @@
+import json
+import os
+import tempfile
+import time
+import uuid
+
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+
+
+# seconds a quote stays valid between the application summary and the loan request
+QUOTE_TTL = 900
+
+# one json file per quote, shared by every worker on the host
+QUOTE_STORE_DIR = os.getenv('QUOTE_STORE_DIR') or os.path.join(tempfile.gettempdir(), 'bridgetrust_quotes')
+
+
+class QuoteStore:
+    """
+    Keeps the quote computed on the application summary page (estimate, schedule, contract and
+    the rate it was priced at) so the loan request can reuse it instead of recomputing.
+
+    The client only ever holds a signed, timestamped token naming the quote, so the figures
+    that end up in the loan request are the ones the server computed.
+    """
+
+    def __init__(self, secret_key, store_dir=QUOTE_STORE_DIR, ttl=QUOTE_TTL):
+        self.serializer = URLSafeTimedSerializer(secret_key, salt='loan-quote')
+        self.store_dir = store_dir
+        self.ttl = ttl
+
+    def quote_path(self, quote_id):
+        """returns the file holding a quote"""
+        return os.path.join(self.store_dir, f'{quote_id}.json')
+
+    def save(self, quote, borrower_id):
+        """
+        Stores a quote and returns the signed token for it.
+
+        Args:
+            quote: JSON serialisable dict of the computed quote
+            borrower_id: Borrower the quote was computed for
+
+        Returns:
+            str: Signed token, or None if the quote could not be stored
+        """
+        try:
+            os.makedirs(self.store_dir, exist_ok=True)
+            self.prune()
+
+            quote_id = uuid.uuid4().hex
+            fd, temp_path = tempfile.mkstemp(dir=self.store_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w') as quote_file:
+                json.dump(quote, quote_file)
+            os.replace(temp_path, self.quote_path(quote_id))
+
+            return self.serializer.dumps({'quote_id': quote_id, 'borrower_id': str(borrower_id)})
+
+        except Exception as e:
+            print(f'Exception while storing quote: {e}')
+            return None
+
+    def load(self, token, borrower_id):
+        """
+        Returns the quote named by a token, or None if the token is missing, tampered with,
+        expired, issued for another borrower, or the quote is gone.
+        """
+        if not token:
+            return None
+
+        try:
+            payload = self.serializer.loads(token, max_age=self.ttl)
+        except SignatureExpired:
+            print('Quote token expired')
+            return None
+        except BadSignature:
+            print('Quote token has a bad signature')
+            return None
+
+        if payload.get('borrower_id') != str(borrower_id):
+            print('Quote token was issued for another borrower')
+            return None
+
+        try:
+            with open(self.quote_path(payload['quote_id'])) as quote_file:
+                quote = json.load(quote_file)
+        except (OSError, ValueError) as e:
+            print(f'Exception while loading quote: {e}')
+            return None
+
+        quote['quote_id'] = payload['quote_id']
+        return quote
+
+    def discard(self, quote_id):
+        """removes a quote once it has been turned into a loan request"""
+        try:
+            os.remove(self.quote_path(quote_id))
+        except OSError:
+            pass
+
+    def prune(self):
+        """removes quotes older than the ttl, their tokens can no longer be redeemed"""
+        cutoff = time.time() - self.ttl
+        for entry in os.scandir(self.store_dir):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
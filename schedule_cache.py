@@ -0,0 +1,217 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, urlsplit, urlunsplit, unquote
+
+from instrumentation import record_call
+
+
+# bucket the schedule files are uploaded to by Loans.upload_and_store_loan_files
+SCHEDULE_BUCKET = 'loan-files'
+
+# parsed schedules kept in memory per worker
+SCHEDULE_CACHE_SIZE = 256
+
+# parsed schedules kept on disk, shared by the workers on this host
+SCHEDULE_CACHE_DIR = os.getenv('SCHEDULE_CACHE_DIR') or os.path.join(
+    tempfile.gettempdir(), 'bridgetrust_schedules'
+)
+
+# the disk tier is trimmed to this many bytes, the least recently read files go first
+SCHEDULE_DISK_CACHE_BYTES = int(os.getenv('SCHEDULE_DISK_CACHE_BYTES', str(512 * 1024 * 1024)))
+
+# files of the disk tier not read for this many seconds are removed whatever the size
+SCHEDULE_DISK_MAX_AGE = 30 * 24 * 3600
+
+_memory_cache = OrderedDict()
+_memory_lock = threading.Lock()
+
+
+def storage_path(url):
+    """returns the bucket/object path of a public storage url, the url itself if it is not one"""
+    path = unquote(urlparse(url).path)
+    marker = '/storage/v1/object/public/'
+    return path.split(marker, 1)[1] if marker in path else url
+
+
+def disk_path(key, extension='.json'):
+    """returns the disk cache file for a storage path"""
+    return os.path.join(SCHEDULE_CACHE_DIR, hashlib.sha256(key.encode('utf-8')).hexdigest() + extension)
+
+
+def parse_schedule_csv(url):
+    """downloads and parses a schedule csv into its headers and rows"""
+    import pandas as pd
+
+    started = time.perf_counter()
+    df = pd.read_csv(url)
+    record_call('storage', SCHEDULE_BUCKET, 'download', ('storage', SCHEDULE_BUCKET, 'download'), rows=len(df),
+                seconds=time.perf_counter() - started)
+    df = df.fillna('')
+
+    return {
+        'headers': df.columns.tolist(),
+        'rows': df.to_dict(orient='records')
+    }
+
+
+def schedule_table(records, summary):
+    """returns the headers and rows of a packed schedule, laid out like the schedule csv"""
+    from portfolio import schedule_export_frame
+    from schedule_format import schedule_frame
+
+    df = schedule_export_frame(schedule_frame(records), summary).fillna('')
+
+    return {
+        'headers': df.columns.tolist(),
+        'rows': df.to_dict(orient='records')
+    }
+
+
+def fetch_packed_schedule(url):
+    """downloads the packed schedule stored next to a schedule csv, None if the loan has none"""
+    import httpx
+    from schedule_format import SCHEDULE_MAGIC, binary_name
+
+    shape = ('storage', SCHEDULE_BUCKET, 'download')
+    started = time.perf_counter()
+    try:
+        parts = urlsplit(url)
+        response = httpx.get(urlunsplit(parts._replace(path=binary_name(parts.path), query='')), timeout=30)
+    except httpx.HTTPError as e:
+        record_call('storage', SCHEDULE_BUCKET, 'download', shape, seconds=time.perf_counter() - started, error=str(e))
+        print(f'Exception while fetching packed schedule: {e}')
+        return None
+
+    record_call('storage', SCHEDULE_BUCKET, 'download', shape, nbytes=len(response.content),
+                seconds=time.perf_counter() - started)
+
+    if response.status_code != 200 or not response.content.startswith(SCHEDULE_MAGIC):
+        return None
+
+    return response.content
+
+
+def read_schedule(url, key):
+    """
+    Reads a schedule from the disk tier or storage. The packed schedule is preferred, it is
+    memory mapped from disk with no parsing. Loans uploaded before it existed only have the
+    csv, which is parsed once and kept on disk as json.
+    """
+    # numpy and pandas are only imported once a schedule is actually viewed
+    from schedule_format import SCHEDULE_EXTENSION, open_schedule, unpack_schedule
+
+    packed_path = disk_path(key, SCHEDULE_EXTENSION)
+    try:
+        schedule = schedule_table(*open_schedule(packed_path))
+        mark_read(packed_path)
+        return schedule
+    except (OSError, ValueError):
+        pass
+
+    try:
+        with open(disk_path(key)) as cache_file:
+            schedule = json.load(cache_file)
+        mark_read(disk_path(key))
+        return schedule
+    except (OSError, ValueError):
+        pass
+
+    packed = fetch_packed_schedule(url)
+    if packed is not None:
+        try:
+            schedule = schedule_table(*unpack_schedule(packed))
+            store_on_disk(packed_path, packed)
+            return schedule
+        except ValueError as e:
+            print(f'Packed schedule {key} is unreadable, falling back to the csv: {e}')
+
+    schedule = parse_schedule_csv(url)
+    store_on_disk(disk_path(key), json.dumps(schedule).encode('utf-8'))
+    return schedule
+
+
+def load_schedule(url):
+    """
+    Returns the parsed payment schedule stored at a public url as a dict of headers and rows.
+
+    Schedule files are never changed after upload, so a parsed schedule never goes stale: it is
+    cached in a per-worker LRU, then on disk (bounded by SCHEDULE_DISK_CACHE_BYTES and
+    SCHEDULE_DISK_MAX_AGE), and only downloaded when neither has it.
+    """
+    key = storage_path(url)
+
+    with _memory_lock:
+        if key in _memory_cache:
+            _memory_cache.move_to_end(key)
+            return _memory_cache[key]
+
+    schedule = read_schedule(url, key)
+
+    with _memory_lock:
+        _memory_cache[key] = schedule
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > SCHEDULE_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+
+    return schedule
+
+
+def mark_read(path):
+    """bumps a disk cache file's mtime, which prune_disk_cache takes as its last use"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def prune_disk_cache(max_bytes=SCHEDULE_DISK_CACHE_BYTES, max_age=SCHEDULE_DISK_MAX_AGE):
+    """
+    Removes the disk cache files not read for max_age seconds, then the least recently read
+    ones until the tier fits in max_bytes. An evicted schedule is downloaded again when viewed.
+    """
+    cutoff = time.time() - max_age
+    entries = []
+
+    try:
+        scan = list(os.scandir(SCHEDULE_CACHE_DIR))
+    except OSError:
+        return
+
+    for entry in scan:
+        try:
+            stat = entry.stat()
+            if stat.st_mtime < cutoff:
+                os.remove(entry.path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            pass
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+
+def store_on_disk(path, content):
+    """writes a cache file of the disk tier, replacing it atomically, after trimming the tier"""
+    try:
+        os.makedirs(SCHEDULE_CACHE_DIR, exist_ok=True)
+        prune_disk_cache(max_bytes=max(0, SCHEDULE_DISK_CACHE_BYTES - len(content)))
+        fd, temp_path = tempfile.mkstemp(dir=SCHEDULE_CACHE_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as cache_file:
+            cache_file.write(content)
+        os.replace(temp_path, path)
+
+    except OSError as e:
+        print(f'Exception while caching schedule {path}: {e}')
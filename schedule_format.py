@@ -0,0 +1,137 @@
+import json
+import os
+import struct
+
+import numpy as np
+import pandas as pd
+
+
+# file signature, bump the trailing version when the layout changes
+SCHEDULE_MAGIC = b'BTSCHED1'
+
+# magic, then the length of the json metadata that follows it
+HEADER = struct.Struct('<8sI')
+
+# the row data starts on this boundary so it can be mapped straight into an array
+ALIGNMENT = 64
+
+SCHEDULE_EXTENSION = '.schedule'
+
+# one record per instalment, in the column order of the payment schedule
+SCHEDULE_DTYPE = np.dtype([
+    ('Payment_Number', '<i4'),
+    ('Payment_Date', '<M8[D]'),
+    ('Beginning_Balance', '<f8'),
+    ('Monthly_Payment', '<f8'),
+    ('Interest_Payment', '<f8'),
+    ('Principal_Payment', '<f8'),
+    ('Ending_Balance', '<f8'),
+    ('Interest_Rate_Applied', '<f8')
+])
+
+
+class ScheduleFormatError(ValueError):
+    """raised when a buffer is not a packed schedule"""
+
+
+def binary_name(csv_name):
+    """returns the name of the binary schedule stored next to a schedule csv (filename or url)"""
+    base, _, extension = csv_name.rpartition('.')
+    return (base if extension.lower() == 'csv' else csv_name) + SCHEDULE_EXTENSION
+
+
+def pack_schedule(schedule_df, summary):
+    """
+    Serializes a payment schedule into the binary schedule format.
+
+    Layout: magic and metadata length, the json metadata (schedule summary, row count, column
+    layout and data offset), zero padding up to the alignment, then the instalment rows as
+    raw little endian records of SCHEDULE_DTYPE.
+
+    Args:
+        schedule_df: The schedule_dataframe returned by generate_payment_schedule_dataframe
+        summary: The schedule_summary returned with it
+
+    Returns:
+        bytes: The packed schedule
+    """
+    records = np.empty(len(schedule_df), dtype=SCHEDULE_DTYPE)
+    for name in SCHEDULE_DTYPE.names:
+        records[name] = np.asarray(schedule_df[name]).astype(SCHEDULE_DTYPE[name])
+
+    metadata = {
+        'summary': summary,
+        'rows': len(records),
+        'dtype': SCHEDULE_DTYPE.descr
+    }
+
+    # the offset is part of the metadata, so grow it until the metadata fits in front of it
+    offset = ALIGNMENT
+    while True:
+        encoded = json.dumps({**metadata, 'offset': offset}).encode('utf-8')
+        if HEADER.size + len(encoded) <= offset:
+            break
+        offset += ALIGNMENT
+
+    header = HEADER.pack(SCHEDULE_MAGIC, len(encoded)) + encoded
+    return header.ljust(offset, b'\0') + records.tobytes()
+
+
+def read_metadata(header, size):
+    """
+    Returns the metadata of a packed schedule, checking its signature and layout.
+
+    Args:
+        header: The start of the packed schedule, at least up to the end of the metadata
+        size: Total size of the packed schedule in bytes
+    """
+    if len(header) < HEADER.size:
+        raise ScheduleFormatError('Buffer is too short to be a packed schedule')
+
+    magic, length = HEADER.unpack_from(header)
+    if magic != SCHEDULE_MAGIC:
+        raise ScheduleFormatError('Buffer is not a packed schedule')
+
+    metadata = json.loads(bytes(header[HEADER.size:HEADER.size + length]))
+    if np.dtype([tuple(field) for field in metadata['dtype']]) != SCHEDULE_DTYPE:
+        raise ScheduleFormatError('Packed schedule has an unknown column layout')
+
+    if size < metadata['offset'] + metadata['rows'] * SCHEDULE_DTYPE.itemsize:
+        raise ScheduleFormatError('Packed schedule is truncated')
+
+    return metadata
+
+
+def unpack_schedule(buffer):
+    """
+    Returns the instalment records and summary of a packed schedule held in memory.
+    The records are a read only view of the buffer, nothing is copied or parsed.
+    """
+    metadata = read_metadata(buffer, len(buffer))
+    records = np.frombuffer(buffer, dtype=SCHEDULE_DTYPE, count=metadata['rows'], offset=metadata['offset'])
+    return records, metadata['summary']
+
+
+def open_schedule(path):
+    """
+    Returns the instalment records and summary of a packed schedule file.
+    The records are memory mapped, pages are only read from disk when they are used.
+    """
+    with open(path, 'rb') as schedule_file:
+        header = schedule_file.read(HEADER.size)
+        if len(header) == HEADER.size:
+            header += schedule_file.read(HEADER.unpack(header)[1])
+        metadata = read_metadata(header, os.fstat(schedule_file.fileno()).st_size)
+
+    if metadata['rows'] == 0:
+        return np.empty(0, dtype=SCHEDULE_DTYPE), metadata['summary']
+
+    records = np.memmap(path, dtype=SCHEDULE_DTYPE, mode='r', offset=metadata['offset'], shape=(metadata['rows'],))
+    return records, metadata['summary']
+
+
+def schedule_frame(records):
+    """returns the instalment records as a schedule dataframe, dates as YYYY-MM-DD strings like the csv"""
+    columns = {name: records[name] for name in SCHEDULE_DTYPE.names}
+    columns['Payment_Date'] = np.datetime_as_string(records['Payment_Date'], unit='D')
+    return pd.DataFrame(columns)
@@ -1,26 +1,17 @@
-import textwrap
-from http.client import responses
-
-import bcrypt
-from supabase import create_client, Client
-from flask import session
+from typing import TYPE_CHECKING
+from database import get_supabase_client
+from config_cache import invalidate_config
 import os
-import random
-import string
-import smtplib
-from email.message import EmailMessage
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 
 class Settings:
     """contains methods required for the home template"""
     def __init__(self):
-        url = os.getenv("SUPABASE_URL")
-        service_role_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-
-        if not url or not service_role_key:
-            raise ValueError("SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY is not set.")
-
-        self.supabase: Client = create_client(url, service_role_key)
+        # shared client for this worker process
+        self.supabase: Client = get_supabase_client()
 
         # email authentication
         self.sender_email = os.getenv('SENDER_EMAIL')
@@ -67,6 +58,42 @@ class Settings:
             return False
 
 
+    def update_nominal_rate(self, nominal_rate):
+        """
+        Saves the nominal rate loans are priced at (the nominal_rate table) and makes every
+        worker reload it from the config cache.
+
+        Args:
+            nominal_rate: Monthly rate in decimal form
+
+        Returns:
+            bool: True if the rate was saved
+        """
+        try:
+            response = self.supabase.table('nominal_rate').select('id').execute()
+            if response.data:
+                response = (
+                    self.supabase
+                    .table('nominal_rate')
+                    .update({'nominal_rate': nominal_rate})
+                    .eq('id', response.data[0]['id'])
+                    .execute()
+                )
+            else:
+                response = self.supabase.table('nominal_rate').insert({'nominal_rate': nominal_rate}).execute()
+
+            if not response.data:
+                print("Nominal rate update failed - no data returned")
+                return False
+
+            # pricing reads the rate from the config cache, make every worker reload it
+            invalidate_config()
+            return True
+
+        except Exception as e:
+            print(f'Exception updating nominal rate: {e}')
+            return False
+
     def load_users(self):
         """returns users data"""
         try:
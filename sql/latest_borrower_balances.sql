@@ -0,0 +1,8 @@
+-- Balance after each borrower's most recent repayment, read by borrowers.load_borrower_relations
+-- so the borrower list fetches one row per borrower instead of every repayment.
+create or replace view latest_borrower_balances as
+select distinct on (borrower_id) borrower_id, balance, created_at
+from loan_repayments
+order by borrower_id, created_at desc;
+
+create index if not exists loan_repayments_borrower_latest on loan_repayments (borrower_id, created_at desc);
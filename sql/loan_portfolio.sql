@@ -0,0 +1,17 @@
+-- One row per loan with its method and the repayments made so far, read by home.load_portfolio
+-- so the dashboard never downloads the repayments themselves.
+create or replace view loan_portfolio as
+select
+    loans.id,
+    loans.loan_request_id,
+    loans.loan_amount,
+    loans.interest_rate,
+    loans.term_months,
+    loans.monthly_payment,
+    loans.created_at,
+    loan_requests.method,
+    (select count(*) from loan_repayments where loan_repayments.loan_id = loans.id) as repayment_count
+from loans
+left join loan_requests on loan_requests.id = loans.loan_request_id;
+
+create index if not exists loan_repayments_loan_id on loan_repayments (loan_id);
@@ -0,0 +1,4 @@
+-- Loan requests are inserted before the job worker (flask --app main run-jobs) has uploaded
+-- their contract and schedule, loan_file_id is filled in by the job once the files exist.
+-- Pending requests without it are hidden from approvers (notifications.exhausted_loan_request_data).
+alter table loan_requests alter column loan_file_id drop not null;
@@ -0,0 +1,133 @@
+-- Running portfolio totals read by the home dashboard (see metrics.py).
+-- Rebuild from scratch at any time with: flask --app main rebuild-metrics
+--
+-- Runs as one transaction holding a share lock on loans and loan_repayments, so no write
+-- lands between the snapshot being seeded from the tables and the triggers taking over.
+begin;
+
+lock table loans, loan_repayments in share mode;
+
+create table if not exists portfolio_metrics (
+    id integer primary key,
+    total_loan_amount numeric not null default 0,
+    loan_count integer not null default 0,
+    total_principal_repaid numeric not null default 0,
+    total_interest_repaid numeric not null default 0,
+    repayment_count integer not null default 0,
+    version integer not null default 1,
+    updated_at timestamptz not null default now()
+);
+
+-- Interest earned per (year, quarter), read by the home dashboard chart.
+-- Kept current by the loan_repayments trigger below, rebuilt together with portfolio_metrics
+-- by the rebuild-metrics command. Backfilled from the existing repayments at the end of this file.
+create table if not exists interest_rollups (
+    year integer not null,
+    quarter integer not null check (quarter between 1 and 4),
+    interest_total numeric not null default 0,
+    version integer not null default 1,
+    primary key (year, quarter)
+);
+
+-- Every write to loans or loan_repayments adjusts the snapshot in the same transaction, so
+-- the totals are current whichever code path (or the SQL editor) made the change. Each
+-- increment bumps the version, which makes a concurrent rebuild read the tables again.
+create or replace function portfolio_metrics_loans_trigger() returns trigger
+language plpgsql as $$
+begin
+    update portfolio_metrics set
+        total_loan_amount = total_loan_amount
+            + case when tg_op <> 'DELETE' then coalesce(new.loan_amount, 0) else 0 end
+            - case when tg_op <> 'INSERT' then coalesce(old.loan_amount, 0) else 0 end,
+        loan_count = loan_count + case tg_op when 'INSERT' then 1 when 'DELETE' then -1 else 0 end,
+        version = version + 1,
+        updated_at = now()
+    where id = 1;
+    return null;
+end;
+$$;
+
+drop trigger if exists portfolio_metrics_loans on loans;
+create trigger portfolio_metrics_loans
+    after insert or delete or update of loan_amount on loans
+    for each row execute function portfolio_metrics_loans_trigger();
+
+create or replace function portfolio_metrics_repayments_trigger() returns trigger
+language plpgsql as $$
+begin
+    update portfolio_metrics set
+        total_principal_repaid = total_principal_repaid
+            + case when tg_op <> 'DELETE' then coalesce(new.principal_component, 0) else 0 end
+            - case when tg_op <> 'INSERT' then coalesce(old.principal_component, 0) else 0 end,
+        total_interest_repaid = total_interest_repaid
+            + case when tg_op <> 'DELETE' then coalesce(new.interest_component, 0) else 0 end
+            - case when tg_op <> 'INSERT' then coalesce(old.interest_component, 0) else 0 end,
+        repayment_count = repayment_count + case tg_op when 'INSERT' then 1 when 'DELETE' then -1 else 0 end,
+        version = version + 1,
+        updated_at = now()
+    where id = 1;
+    return null;
+end;
+$$;
+
+drop trigger if exists portfolio_metrics_repayments on loan_repayments;
+create trigger portfolio_metrics_repayments
+    after insert or delete or update of principal_component, interest_component on loan_repayments
+    for each row execute function portfolio_metrics_repayments_trigger();
+
+-- Repayments add their interest to the rollup of the quarter they were created in, creating
+-- the quarter's row on its first repayment. Quarters are taken in the session time zone (UTC).
+create or replace function interest_rollups_repayments_trigger() returns trigger
+language plpgsql as $$
+begin
+    if tg_op <> 'INSERT' and old.created_at is not null then
+        update interest_rollups set
+            interest_total = interest_total - coalesce(old.interest_component, 0),
+            version = version + 1
+        where year = extract(year from old.created_at)::integer
+          and quarter = extract(quarter from old.created_at)::integer;
+    end if;
+
+    if tg_op <> 'DELETE' and new.created_at is not null then
+        insert into interest_rollups (year, quarter, interest_total)
+        values (extract(year from new.created_at)::integer,
+                extract(quarter from new.created_at)::integer,
+                coalesce(new.interest_component, 0))
+        on conflict (year, quarter) do update set
+            interest_total = interest_rollups.interest_total + excluded.interest_total,
+            version = interest_rollups.version + 1;
+    end if;
+
+    return null;
+end;
+$$;
+
+drop trigger if exists interest_rollups_repayments on loan_repayments;
+create trigger interest_rollups_repayments
+    after insert or delete or update of interest_component, created_at on loan_repayments
+    for each row execute function interest_rollups_repayments_trigger();
+
+-- The snapshot row the triggers above keep current, seeded from the book as it stands. An
+-- existing row is left alone, the triggers have kept it current since it was created.
+insert into portfolio_metrics (id, total_loan_amount, loan_count, total_principal_repaid,
+                               total_interest_repaid, repayment_count)
+select 1,
+       (select coalesce(sum(loan_amount), 0) from loans),
+       (select count(*) from loans),
+       (select coalesce(sum(principal_component), 0) from loan_repayments),
+       (select coalesce(sum(interest_component), 0) from loan_repayments),
+       (select count(*) from loan_repayments)
+on conflict (id) do nothing;
+
+-- Backfills the quarters of the repayments made before the trigger existed, grouped the same
+-- way the trigger does. Quarters that already have a row are left to the trigger.
+insert into interest_rollups (year, quarter, interest_total)
+select extract(year from created_at)::integer,
+       extract(quarter from created_at)::integer,
+       coalesce(sum(interest_component), 0)
+from loan_repayments
+where created_at is not null
+group by 1, 2
+on conflict (year, quarter) do nothing;
+
+commit;
@@ -0,0 +1,10 @@
+-- Content addressed objects already in storage (see uploads.ContentIndex).
+-- Objects are named after the sha256 of their content, so one object can back many
+-- borrower_files rows; rows here are never deleted with a borrower.
+create table if not exists stored_objects (
+    bucket text not null,
+    object_path text not null,
+    url text not null,
+    created_at timestamptz not null default now(),
+    primary key (bucket, object_path)
+);
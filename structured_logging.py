@@ -0,0 +1,186 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+
+# DEBUG records are dropped unless LOG_LEVEL=DEBUG, the dev server (python main.py) turns them on
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+# fraction of DEBUG and INFO records kept, warnings and errors are always kept
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '1.0'))
+
+# every logger of the app is a child of this one
+ROOT_LOGGER = 'bridgetrust'
+
+# keyword arguments handled by logging itself, everything else passed to a log call is a field
+LOGGING_KWARGS = ('exc_info', 'stack_info', 'stacklevel', 'extra')
+
+
+class JsonFormatter(logging.Formatter):
+    """formats a record as one json object per line: time, level, logger, event and its fields"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage()
+        }
+        entry.update(getattr(record, 'fields', {}))
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """keeps a fraction of the records below WARNING"""
+
+    def __init__(self, rate=LOG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+class ProcessQueueHandler(QueueHandler):
+    """
+    Hands records to a background thread that writes them, so a request never waits on stdout.
+
+    The writer thread is started by the first record of each process: threads do not survive
+    a fork, so gunicorn workers forked from a preloaded master start their own.
+    """
+
+    def __init__(self, handler):
+        super().__init__(queue.SimpleQueue())
+        self.handler = handler
+        self.listener = None
+        self.pid = None
+        self.listener_lock = threading.Lock()
+
+    def start(self):
+        with self.listener_lock:
+            if self.pid == os.getpid():
+                return
+
+            # the parent's queue belongs to its listener, this process gets its own
+            self.queue = queue.SimpleQueue()
+            self.listener = QueueListener(self.queue, self.handler, respect_handler_level=True)
+            self.listener.start()
+            self.pid = os.getpid()
+
+    def stop(self):
+        """writes out the queued records and stops the writer thread of this process"""
+        with self.listener_lock:
+            if self.listener is not None and self.pid == os.getpid():
+                self.listener.stop()
+            self.listener = None
+            self.pid = None
+
+    def prepare(self, record):
+        # resolve the message and traceback now, the json is built on the writer thread
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.pid != os.getpid():
+            self.start()
+        self.queue.put_nowait(record)
+
+
+class EventLogger(logging.LoggerAdapter):
+    """
+    Logger taking an event name and keyword fields:
+
+        logger.info('loan request created', loan_request_id=request_id, borrower_id=borrower_id)
+
+    Arguments are still evaluated when the level is disabled, guard expensive ones with
+    logger.isEnabledFor(logging.DEBUG).
+    """
+
+    def process(self, msg, kwargs):
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in LOGGING_KWARGS}
+        extra = dict(kwargs.get('extra') or {})
+        extra['fields'] = {**extra.get('fields', {}), **fields}
+        kwargs['extra'] = extra
+        return msg, kwargs
+
+
+_handler = None
+_configure_lock = threading.Lock()
+
+
+def configure_logging(level=None, sample_rate=None, stream=None):
+    """
+    Sets up the app's loggers: json lines written by a background thread, filtered by level
+    and sampled. Safe to call again, e.g. to change the level.
+
+    Args:
+        level: Level name or number, defaults to LOG_LEVEL
+        sample_rate: Fraction of DEBUG and INFO records kept, defaults to LOG_SAMPLE_RATE
+        stream: Where records are written, defaults to stderr
+    """
+    global _handler
+
+    with _configure_lock:
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(level or LOG_LEVEL)
+
+        if _handler is None or stream is not None:
+            if _handler is not None:
+                _handler.stop()
+                root.removeHandler(_handler)
+
+            writer = logging.StreamHandler(stream or sys.stderr)
+            writer.setFormatter(JsonFormatter())
+            _handler = ProcessQueueHandler(writer)
+            _handler.addFilter(SamplingFilter())
+            root.addHandler(_handler)
+            # the app's records are written once, by this handler
+            root.propagate = False
+
+        if sample_rate is not None:
+            for log_filter in _handler.filters:
+                if isinstance(log_filter, SamplingFilter):
+                    log_filter.rate = sample_rate
+
+
+def get_logger(name):
+    """
+    Returns the structured logger of a module, configuring logging on first use.
+
+    Args:
+        name: Usually the module's __name__
+
+    Returns:
+        EventLogger: Logger named bridgetrust.<name>
+    """
+    if _handler is None:
+        configure_logging()
+    return EventLogger(logging.getLogger(f'{ROOT_LOGGER}.{name}'), {})
+
+
+def flush_logs():
+    """writes out every queued record, registered to run at exit"""
+    if _handler is not None:
+        _handler.stop()
+
+
+atexit.register(flush_logs)
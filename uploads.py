@@ -0,0 +1,234 @@
+import base64
+import hashlib
+import os
+import time
+from typing import TYPE_CHECKING
+
+from database import get_supabase_client
+from instrumentation import record_call
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+
+# supabase storage requires every resumable chunk but the last to be exactly 6MB
+CHUNK_SIZE = 6 * 1024 * 1024
+
+# attempts per chunk before the upload is given up, with a growing delay in between
+CHUNK_RETRIES = 3
+RETRY_DELAY = 0.5
+
+# files up to this size are sent in one request, larger ones through the resumable endpoint
+STREAMING_THRESHOLD = CHUNK_SIZE
+
+TUS_VERSION = '1.0.0'
+
+
+class StreamUploadResult:
+    """
+    outcome of a streamed upload, shaped like a storage response (data on success, error on failure).
+    exists is set when the upload was refused because the object is already in the bucket.
+    """
+
+    def __init__(self, data=None, error=None, exists=False):
+        self.data = data
+        self.error = error
+        self.exists = exists
+
+
+def already_exists(error):
+    """true when a storage error means the object is already stored (409 Duplicate)"""
+    if getattr(error, 'exists', False):
+        return True
+    code = str(getattr(error, 'code', '') or '')
+    status = str(getattr(error, 'status', '') or '')
+    return code == 'Duplicate' or status == '409' or 'already exists' in str(error).lower()
+
+
+def stream_size(stream):
+    """returns the number of bytes left in a seekable stream without reading it"""
+    start = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell() - start
+    stream.seek(start)
+    return size
+
+
+def encode_metadata(metadata):
+    """encodes the Upload-Metadata header, comma separated keys with base64 values"""
+    return ','.join(
+        f"{key} {base64.b64encode(str(value).encode('utf-8')).decode('ascii')}"
+        for key, value in metadata.items()
+    )
+
+
+def stream_upload(bucket, object_path, stream, content_type, upsert=False):
+    """
+    Uploads a file stream to a storage bucket with the resumable (tus) protocol.
+
+    The stream is read one chunk at a time, so at most CHUNK_SIZE bytes of the file are held
+    in memory however large it is. A chunk that fails is retried from the offset the server
+    reports, so a dropped connection resumes instead of starting over.
+
+    Args:
+        bucket: Bucket name
+        object_path: Path of the object inside the bucket
+        stream: Seekable binary stream positioned at the start of the file
+        content_type: Content type stored with the object
+        upsert: Overwrite an existing object at the same path
+
+    Returns:
+        StreamUploadResult: data holds the object path on success, error the reason on failure
+    """
+    url = os.getenv("SUPABASE_URL")
+    service_role_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+    if not url or not service_role_key:
+        return StreamUploadResult(error="SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY is not set.")
+
+    headers = {
+        'authorization': f'Bearer {service_role_key}',
+        'apikey': service_role_key,
+        'tus-resumable': TUS_VERSION
+    }
+
+    import httpx
+
+    shape = ('storage', bucket, 'resumable_upload')
+    started = time.perf_counter()
+
+    try:
+        size = stream_size(stream)
+        origin = stream.tell()
+
+        with httpx.Client(timeout=60) as client:
+            create_response = client.post(
+                f"{url.rstrip('/')}/storage/v1/upload/resumable",
+                headers={
+                    **headers,
+                    'upload-length': str(size),
+                    'upload-metadata': encode_metadata({
+                        'bucketName': bucket,
+                        'objectName': object_path,
+                        'contentType': content_type,
+                        'cacheControl': 3600
+                    }),
+                    'x-upsert': 'true' if upsert else 'false'
+                }
+            )
+            if create_response.status_code != 201:
+                return StreamUploadResult(error=f"Could not start upload: {create_response.status_code} "
+                                                f"{create_response.text}",
+                                          exists=create_response.status_code == 409)
+
+            upload_url = create_response.headers['location']
+            offset = 0
+
+            while offset < size:
+                stream.seek(origin + offset)
+                chunk = stream.read(CHUNK_SIZE)
+                offset = send_chunk(client, upload_url, headers, chunk, offset)
+
+            record_call('storage', bucket, 'resumable_upload', shape, nbytes=size,
+                        seconds=time.perf_counter() - started)
+            return StreamUploadResult(data={'path': object_path, 'size': size})
+
+    except Exception as e:
+        record_call('storage', bucket, 'resumable_upload', shape, seconds=time.perf_counter() - started, error=str(e))
+        return StreamUploadResult(error=str(e))
+
+
+def send_chunk(client, upload_url, headers, chunk, offset):
+    """
+    Sends one chunk at the given offset and returns the offset after it, retrying from
+    the offset the server last acknowledged when a request fails.
+    """
+    import httpx
+
+    for attempt in range(1, CHUNK_RETRIES + 1):
+        try:
+            response = client.patch(
+                upload_url,
+                content=chunk,
+                headers={
+                    **headers,
+                    'upload-offset': str(offset),
+                    'content-type': 'application/offset+octet-stream'
+                }
+            )
+            if response.status_code == 204:
+                return int(response.headers['upload-offset'])
+
+            error = f"{response.status_code} {response.text}"
+
+        except httpx.TransportError as e:
+            error = str(e)
+
+        if attempt == CHUNK_RETRIES:
+            break
+
+        time.sleep(RETRY_DELAY * 2 ** (attempt - 1))
+
+        # the server may have stored part of the chunk before the failure
+        head_response = client.head(upload_url, headers=headers)
+        if head_response.status_code == 200:
+            acknowledged = int(head_response.headers['upload-offset'])
+            if acknowledged != offset:
+                # resume from what the server has, the caller re-reads from there
+                return acknowledged
+
+    raise RuntimeError(f"Chunk at offset {offset} failed after {CHUNK_RETRIES} attempts: {error}")
+
+
+def content_digest(file_object):
+    """
+    Returns the sha256 hex digest of a file's content.
+    Streams (werkzeug FileStorage) are hashed chunk by chunk and rewound afterwards.
+    """
+    if isinstance(file_object, (bytes, bytearray)):
+        return hashlib.sha256(file_object).hexdigest()
+
+    stream = getattr(file_object, 'stream', file_object)
+    start = stream.tell()
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    stream.seek(start)
+
+    return digest.hexdigest()
+
+
+class ContentIndex:
+    """
+    Remembers which content addressed objects are already in storage, so an identical
+    document is never uploaded twice. Kept in the stored_objects table (sql/stored_objects.sql)
+    so every worker and host shares it and it survives a redeploy.
+
+    The index only saves sending the bytes again: uploads never overwrite, so an object that
+    is missing from it is still detected by the storage api refusing the duplicate.
+    """
+
+    def __init__(self):
+        # shared client for this worker process
+        self.supabase: Client = get_supabase_client()
+
+    def get(self, bucket, object_path):
+        """returns the public url of a stored object, or None if it is not known to be uploaded"""
+        response = (
+            self.supabase
+            .table('stored_objects')
+            .select('url')
+            .eq('bucket', bucket)
+            .eq('object_path', object_path)
+            .execute()
+        )
+        return response.data[0]['url'] if response.data else None
+
+    def put(self, bucket, object_path, url):
+        """records an object once it is in storage"""
+        (
+            self.supabase
+            .table('stored_objects')
+            .upsert({'bucket': bucket, 'object_path': object_path, 'url': url}, on_conflict='bucket,object_path')
+            .execute()
+        )
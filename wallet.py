@@ -1,35 +1,25 @@
-import textwrap
-from http.client import responses
-
-import bcrypt
-from numpy.ma.core import repeat
-from supabase import create_client, Client
-from flask import session
+from typing import TYPE_CHECKING
+from database import get_supabase_client
 import os
-import random
-import string
-import smtplib
-from email.message import EmailMessage
 import uuid
+from datetime import datetime
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 
 class Wallet:
     """contains methods required for the home template"""
     def __init__(self):
-        url = os.getenv("SUPABASE_URL")
-        service_role_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-
-        if not url or not service_role_key:
-            raise ValueError("SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY is not set.")
-
-        self.supabase: Client = create_client(url, service_role_key)
+        # shared client for this worker process
+        self.supabase: Client = get_supabase_client()
 
         # email authentication
         self.sender_email = os.getenv('SENDER_EMAIL')
         self.email_password = os.getenv('EMAIL_PASSWORD')
 
     def load_transactions(self):
-        """loads transactions in the wallet table"""
+        """loads transactions in the wallet table, created_at parsed to a datetime for the template"""
         try:
             response = (
                 self.supabase
@@ -38,6 +28,15 @@ class Wallet:
                 .execute()
             )
 
+            # postgrest returns timestamps as iso strings, wallet.html formats them with strftime
+            for transaction in response.data:
+                created_at = transaction.get('created_at')
+                if isinstance(created_at, str):
+                    try:
+                        transaction['created_at'] = datetime.fromisoformat(created_at)
+                    except ValueError:
+                        transaction['created_at'] = None
+
             return response.data
 
         except Exception as e:
@@ -119,7 +118,3 @@ class Wallet:
             return True, wallet_response.data
         except Exception as e:
             return False, f'Error inserting withdrawal: {e}'
-
-
-test = Wallet()
-print(test.load_transactions())
\ No newline at end of file